@@ -0,0 +1,269 @@
+"""
+Scaling benchmarks for the path extraction and the learner, on synthetic
+corpora written by corpus-parsing/synthetic_corpus.py.
+
+For every corpus size, each stage runs in a fresh process (so that its peak
+memory is its own) and reports its time, throughput and peak resident
+memory. Extraction stages stream the xml with iter_sentences; the steps a
+stage depends on are run too, but only the stage itself is timed:
+    parse     - iter_sentences over the corpus (sentences)
+    text      - extract_text_from_terminals (sentences)
+    index     - build_f_index (sentences)
+    edges     - find_pred and find_edges (sentences)
+    paths     - analyze_one_dependency for every dependency (dependencies)
+    extract   - analyze_sentence, end to end (sentences)
+Learner stages use the path corpus written with the xml:
+    train     - NgramModel.from_paths (paths)
+    score     - NgramModel.score of all corpus paths (paths)
+    bootstrap - BootstrapEngine on the condition paths of conditions.json
+                (bootstrap samples)
+
+Results can be saved as json and compared with an earlier run: a stage whose
+throughput dropped, or whose peak memory grew, by more than the tolerance is
+reported as a regression (and the exit status is 1). Stages that take less
+than --min-seconds in either run are not compared: their timings are mostly
+noise.
+
+Usage:
+    python benchmark.py --sizes 1000 10000 --output run.json
+    python benchmark.py --sizes 1000 10000 --baseline run.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PARSING = os.path.join(HERE, '..', 'corpus-parsing')
+LEARNER = os.path.join(HERE, '..', 'learner-implementation')
+
+EXTRACTION_STAGES = ['parse', 'text', 'index', 'edges', 'paths', 'extract']
+LEARNER_STAGES = ['train', 'score', 'bootstrap']
+STAGES = EXTRACTION_STAGES + LEARNER_STAGES
+
+
+def peak_memory_mb():
+    """
+    :return: peak resident memory of this process in MB (None if unknown)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # bytes on macOS, kilobytes on Linux
+        return peak / 2 ** 20
+    return peak / 2 ** 10
+
+
+def corpus_files(workdir, size, seed):
+    """
+    Write the synthetic corpus of a size, unless it is already there.
+    :param workdir: directory of the generated corpora
+    :param size: number of sentences
+    :param seed: random seed of the generator
+    :return: path of the xml file, path of the path corpus (csv)
+    """
+    sys.path.insert(0, CORPUS_PARSING)
+    from synthetic_corpus import write_corpus
+    os.makedirs(workdir, exist_ok=True)
+    xml_file = os.path.join(workdir, f'synthetic_{size}_{seed}.xml')
+    paths_file = os.path.join(workdir, f'synthetic_{size}_{seed}.csv')
+    if not (os.path.exists(xml_file) and os.path.exists(paths_file)):
+        write_corpus(xml_file + '.tmp', size, paths_file + '.tmp', seed)
+        os.replace(paths_file + '.tmp', paths_file)
+        os.replace(xml_file + '.tmp', xml_file)
+    return xml_file, paths_file
+
+
+def run_extraction_stage(stage, xml_file):
+    """
+    :param stage: one of EXTRACTION_STAGES
+    :param xml_file: synthetic corpus
+    :return: seconds spent in the stage, number of items processed
+    """
+    sys.path.insert(0, CORPUS_PARSING)
+    import find_f_labels as ffl
+    seconds = 0.0
+    items = 0
+    with open(xml_file, 'rb') as f:
+        sentences = ffl.iter_sentences(f)
+        while True:
+            start = time.perf_counter()
+            sentence = next(sentences, None)
+            if stage == 'parse':
+                seconds += time.perf_counter() - start
+            if sentence is None:
+                break
+            if stage in ('parse', 'text', 'index', 'extract'):
+                start = time.perf_counter()
+                if stage == 'text':
+                    ffl.extract_text_from_terminals(sentence)
+                elif stage == 'index':
+                    ffl.build_f_index(sentence)
+                elif stage == 'extract':
+                    ffl.analyze_sentence(sentence)
+                seconds += time.perf_counter() - start
+                items += 1
+                continue
+            f_index = ffl.build_f_index(sentence)
+            start = time.perf_counter()
+            f_levels, pred_values = ffl.find_pred(sentence)
+            edges, truncation_points = ffl.find_edges(
+                sentence, f_levels, pred_values, f_index=f_index)
+            if stage == 'edges':
+                seconds += time.perf_counter() - start
+                items += 1
+                continue
+            start = time.perf_counter()
+            chain_cache = dict()
+            for k, (f_level, pred_value) in enumerate(edges.items()):
+                ffl.analyze_one_dependency(sentence, truncation_points[k],
+                                           f_level, pred_value, '',
+                                           f_index=f_index,
+                                           chain_cache=chain_cache)
+            seconds += time.perf_counter() - start
+            items += len(edges)
+            del ffl.worked_ids[:]
+            del ffl.failing_labels[:]
+    return seconds, items
+
+
+def run_learner_stage(stage, paths_file, n_gram, samples):
+    """
+    :param stage: one of LEARNER_STAGES
+    :param paths_file: path corpus of the synthetic corpus
+    :param n_gram: n-gram window size as int
+    :param samples: number of bootstrap samples
+    :return: seconds spent in the stage, number of items processed
+    """
+    sys.path.insert(0, LEARNER)
+    import pandas as pd
+    from learner_functions import BootstrapEngine, NgramModel
+    from run_experiments import condition_table, load_spec
+    paths = pd.read_csv(paths_file, keep_default_na=False)['cleaned_path']
+    paths = [path for path in paths if path]
+    if stage == 'bootstrap':
+        table = condition_table(load_spec(os.path.join(LEARNER,
+                                                       'conditions.json')))
+        start = time.perf_counter()
+        engine = BootstrapEngine(paths, table['path'], n_gram)
+        engine.sample(samples, seed=1)
+        return time.perf_counter() - start, samples
+    start = time.perf_counter()
+    model = NgramModel.from_paths(paths, n_gram)
+    if stage == 'score':
+        start = time.perf_counter()
+        model.score(paths)
+    return time.perf_counter() - start, len(paths)
+
+
+def measure(stage, xml_file, paths_file, n_gram, samples):
+    """
+    Run one stage in a fresh process.
+    :return: dict with seconds, items, items_per_s and peak_mb
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--run-stage', stage,
+               '--xml', xml_file, '--paths', paths_file,
+               '--n-gram', str(n_gram), '--samples', str(samples)]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def compare(results, baseline, tolerance, min_seconds=0.25):
+    """
+    :param results: list of result dicts of this run
+    :param baseline: list of result dicts of an earlier run
+    :param tolerance: allowed relative change (e.g. 0.2)
+    :param min_seconds: stages shorter than this in either run are skipped
+    :return: list of regression messages
+    """
+    earlier = {(r['size'], r['stage']): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = earlier.get((r['size'], r['stage']))
+        if old is None or min(r['seconds'], old['seconds']) < min_seconds:
+            continue
+        if r['items_per_s'] < old['items_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{r['stage']} @ {r['size']}: {r['items_per_s']:.0f}/s, "
+                f"was {old['items_per_s']:.0f}/s")
+        if r['peak_mb'] and old['peak_mb'] and \
+                r['peak_mb'] > old['peak_mb'] * (1 + tolerance):
+            regressions.append(
+                f"{r['stage']} @ {r['size']}: {r['peak_mb']:.0f} MB peak, "
+                f"was {old['peak_mb']:.0f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000, 1000000],
+                        help='corpus sizes in sentences')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--workdir', default=os.path.join(HERE, 'data'),
+                        help='directory for the generated corpora')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--n-gram', type=int, default=2)
+    parser.add_argument('--samples', type=int, default=100,
+                        help='number of bootstrap samples')
+    parser.add_argument('--output', help='write the results as json')
+    parser.add_argument('--baseline', help='results json of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative change reported as a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.25,
+                        help='shortest stage time that is compared with the '
+                             'baseline')
+    parser.add_argument('--run-stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--xml', help=argparse.SUPPRESS)
+    parser.add_argument('--paths', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:  # child process
+        if args.run_stage in EXTRACTION_STAGES:
+            seconds, items = run_extraction_stage(args.run_stage, args.xml)
+        else:
+            seconds, items = run_learner_stage(args.run_stage, args.paths,
+                                               args.n_gram, args.samples)
+        print(json.dumps({'seconds': seconds, 'items': items,
+                          'items_per_s': items / seconds if seconds else 0.0,
+                          'peak_mb': peak_memory_mb()}))
+        return
+
+    results = []
+    print(f"{'size':>8} {'stage':<10} {'seconds':>9} {'items':>9} "
+          f"{'items/s':>10} {'peak MB':>8}")
+    for size in args.sizes:
+        xml_file, paths_file = corpus_files(args.workdir, size, args.seed)
+        for stage in args.stages:
+            result = measure(stage, xml_file, paths_file, args.n_gram,
+                             args.samples)
+            result.update(size=size, stage=stage)
+            results.append(result)
+            peak = f"{result['peak_mb']:8.0f}" if result['peak_mb'] else \
+                f"{'-':>8}"
+            print(f"{size:>8} {stage:<10} {result['seconds']:9.3f} "
+                  f"{result['items']:>9} {result['items_per_s']:10.0f} "
+                  f"{peak}", flush=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance,
+                                  args.min_seconds)
+        for message in regressions:
+            print('REGRESSION:', message)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
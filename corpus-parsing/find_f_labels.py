@@ -2,17 +2,217 @@ import re
 import xml.etree.ElementTree as ET
 import xml
 import string
+import sys
 import os
-import nltk
+import argparse
+import bz2
+import glob
+import gzip
+import hashlib
+import heapq
+import json
+import lzma
+import time
 
 
  # Set this variable to True to print info messages
 verbose_default = False
 
 
+# Diagnostics of the current run (cleared at the start of every main call)
 failing_labels = []
 worked_ids = []
 
+# start tag of a sentence in the raw xml (see iter_sentence_xml)
+sentence_start = re.compile(rb'<s[\s>]')
+# id of a sentence in the raw xml (see SentenceCache)
+sentence_id_pattern = re.compile(rb'<s\s[^>]*?\bid="([^"]*)"')
+
+# Compressed corpus files, recognized by their first bytes (see open_corpus)
+compressions = [(b'\x1f\x8b', gzip.open), (b'BZh', bz2.open),
+                (b'\xfd7zXZ\x00', lzma.open)]
+compression_extensions = ('.gz', '.bz2', '.xz')
+
+# Version of the extraction, part of the key of every cached sentence (see
+# SentenceCache): increase it when a change of the code changes the rows
+cache_version = 1
+
+# Instrumentation of the extraction stages (see enable_profiling); None
+# while profiling is disabled
+profiler = None
+
+PROFILED_STAGES = ['create_graph', 'find_pred', 'find_edges',
+                   'find_syntactic_position', 'find_embedding_level_recursive',
+                   'truncate_path', 'clean_path']
+
+
+class Profiler:
+    """
+    Per-stage timing and counters of the extraction.
+    While profiling is enabled, the stage functions of this module are
+    replaced by timing wrappers (so disabled profiling costs nothing), and
+    analyze_dependencies is timed per sentence to find the slowest sentences.
+    Failures are counted by stage and category through record_failure.
+    """
+
+    def __init__(self, slowest: int = 20):
+        """
+        :param slowest: number of slowest sentences to keep
+        """
+        self.slowest = slowest
+        self.stages = {stage: {'calls': 0, 'sentences': 0,
+                               'failed_sentences': 0, 'seconds': 0.0,
+                               'max_seconds': 0.0}
+                       for stage in PROFILED_STAGES}
+        self.failures = dict()  # stage -> category -> count
+        self.sentences = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.slowest_sentences = list()  # heap of (seconds, sentence id, rows)
+        self.last_sentence = dict()  # stage -> number of the last sentence seen
+        self.last_failed = dict()  # stage -> number of the last failed sentence
+        self.originals = dict()  # function name -> unwrapped function
+
+    def wrap(self, name: str, func):
+        """
+        :param name: name of a stage function, or analyze_dependencies
+        :param func: the function
+        :return: timing wrapper of the function
+        """
+        self.originals[name] = func
+        perf_counter = time.perf_counter
+        if name == 'analyze_dependencies':
+            def timed(sentence, *args, **kwargs):
+                self.sentences += 1
+                start = perf_counter()
+                lines = func(sentence, *args, **kwargs)
+                seconds = perf_counter() - start
+                rows = sum(len(type_lines) for type_lines in lines.values())
+                self.seconds += seconds
+                self.rows += rows
+                item = (seconds, sentence.attrib.get('id', ''), rows)
+                if len(self.slowest_sentences) < self.slowest:
+                    heapq.heappush(self.slowest_sentences, item)
+                elif self.slowest:
+                    heapq.heappushpop(self.slowest_sentences, item)
+                return lines
+            return timed
+        stats = self.stages[name]
+
+        def timed(*args, **kwargs):
+            if self.last_sentence.get(name) != self.sentences:
+                self.last_sentence[name] = self.sentences
+                stats['sentences'] += 1
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = perf_counter() - start
+                stats['calls'] += 1
+                stats['seconds'] += seconds
+                if seconds > stats['max_seconds']:
+                    stats['max_seconds'] = seconds
+        return timed
+
+    def failure(self, stage: str, category: str) -> None:
+        """
+        Count a failure of the current sentence in a stage.
+        """
+        categories = self.failures.setdefault(stage, dict())
+        categories[category] = categories.get(category, 0) + 1
+        if stage in self.stages and self.last_failed.get(stage) != self.sentences:
+            self.last_failed[stage] = self.sentences
+            self.stages[stage]['failed_sentences'] += 1
+
+    def merge(self, report: dict) -> None:
+        """
+        Add the counters of a report (e.g. from a worker process).
+        :param report: dict as returned by report
+        """
+        self.sentences += report['sentences']
+        self.rows += report['rows']
+        self.seconds += report['seconds']
+        for stage, other in report['stages'].items():
+            stats = self.stages[stage]
+            for key in ('calls', 'sentences', 'failed_sentences', 'seconds'):
+                stats[key] += other[key]
+            stats['max_seconds'] = max(stats['max_seconds'],
+                                       other['max_ms'] / 1000)
+        for stage, categories in report['failures'].items():
+            mine = self.failures.setdefault(stage, dict())
+            for category, count in categories.items():
+                mine[category] = mine.get(category, 0) + count
+        for item in report['slowest_sentences']:
+            item = (item['seconds'], item['sentence_id'], item['rows'])
+            if len(self.slowest_sentences) < self.slowest:
+                heapq.heappush(self.slowest_sentences, item)
+            elif self.slowest:
+                heapq.heappushpop(self.slowest_sentences, item)
+
+    def report(self) -> dict:
+        """
+        :return: json-serializable dict with the totals, one entry per stage
+                 (calls, sentences entering it, sentences failing in it,
+                 cumulative and per-call time), the failures by stage and
+                 category, and the slowest sentences
+        """
+        stages = dict()
+        for stage, stats in self.stages.items():
+            stages[stage] = {'calls': stats['calls'],
+                             'sentences': stats['sentences'],
+                             'failed_sentences': stats['failed_sentences'],
+                             'seconds': stats['seconds'],
+                             'ms_per_call': 1000 * stats['seconds']
+                             / stats['calls'] if stats['calls'] else 0.0,
+                             'max_ms': 1000 * stats['max_seconds']}
+        return {'sentences': self.sentences,
+                'rows': self.rows,
+                'seconds': self.seconds,
+                'sentences_per_s': self.sentences / self.seconds
+                if self.seconds else 0.0,
+                'stages': stages,
+                'failures': self.failures,
+                'slowest_sentences': [
+                    {'sentence_id': sentence_id, 'seconds': seconds,
+                     'rows': rows}
+                    for seconds, sentence_id, rows
+                    in sorted(self.slowest_sentences, reverse=True)]}
+
+
+def enable_profiling(slowest: int = 20) -> Profiler:
+    """
+    Start instrumenting the extraction stages with a new Profiler.
+    :param slowest: number of slowest sentences to keep
+    :return: the Profiler (also available as the module's profiler)
+    """
+    global profiler
+    disable_profiling()
+    profiler = Profiler(slowest)
+    module = globals()
+    for name in PROFILED_STAGES + ['analyze_dependencies']:
+        module[name] = profiler.wrap(name, module[name])
+    return profiler
+
+
+def disable_profiling() -> None:
+    """
+    Restore the uninstrumented stage functions.
+    """
+    global profiler
+    if profiler is not None:
+        globals().update(profiler.originals)
+    profiler = None
+
+
+def record_failure(stage: str, category: str) -> None:
+    """
+    Count a failure of the current sentence, if profiling is enabled.
+    :param stage: stage the failure happened in
+    :param category: failure reason (without sentence-specific details)
+    """
+    if profiler is not None:
+        profiler.failure(stage, category)
+
 
 def write_file(filename:str, lines:str) -> None:
     """ Writing out a file based on array of strings (lines) """
@@ -21,6 +221,34 @@ def write_file(filename:str, lines:str) -> None:
             file.write(line)
 
 
+def open_corpus(filename: str):
+    """
+    Open a corpus file for reading as a binary stream. gzip, bz2 and xz
+    compressed files are decompressed on the fly while they are read, so
+    they never have to be unpacked on disk.
+    :param filename: tiger xml-file, compressed or not
+    :return: file object in binary mode
+    """
+    with open(filename, 'rb') as file:
+        head = file.read(6)
+    for magic, open_compressed in compressions:
+        if head.startswith(magic):
+            return open_compressed(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def corpus_name(filename: str) -> str:
+    """
+    :param filename: corpus file name
+    :return: the file name without its compression and xml extensions (e.g.
+             shard_01 for shard_01.xml.gz)
+    """
+    name, extension = os.path.splitext(filename)
+    if extension in compression_extensions:
+        name, extension = os.path.splitext(name)
+    return name
+
+
 def split_sentences(xml_file: xml.etree.ElementTree.Element) -> list:
     """
     Split the xml into smaller xml pieces corresponding to sentences (<s> ... </s>)
@@ -33,6 +261,28 @@ def split_sentences(xml_file: xml.etree.ElementTree.Element) -> list:
     return sentences
 
 
+def iter_sentences(xml_file) -> iter:
+    """
+    Streaming alternative to split_sentences: parse the xml incrementally and
+    yield one sentence (<s> ... </s>) at a time. Each sentence is cleared and
+    detached from its parent once the caller is done with it, so memory use
+    does not grow with the size of the corpus.
+    :param xml_file: tiger xml-file with parsed sentences
+    :return: generator of sentence parses in xml
+    """
+    parents = list()  # chain of currently open elements
+    for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag == 's':
+            yield elem
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+
 def get_IDs(sentence: xml.etree.ElementTree.Element, 
             verbose: bool = verbose_default) -> tuple:
     """
@@ -128,7 +378,7 @@ def recursive_lookup(graph:dict, curr_id:str) -> str:
 def convert_graph_to_nltk_tree(graph:dict, 
                                root_id:str,
                                verbose:bool = verbose_default) \
-    -> nltk.tree.tree.Tree:
+    -> 'nltk.tree.tree.Tree':
     """
     Generate nltk compatible string representation of entire sentence by
     starting at the root node.
@@ -140,17 +390,40 @@ def convert_graph_to_nltk_tree(graph:dict,
     nltk_str = recursive_lookup(graph, root_id)
     if verbose:
         print(f"INFO: nltk_str={nltk_str}")
+    import nltk  # only needed for the c-structure text
     tree = nltk.tree.tree.Tree.fromstring(nltk_str + ')')
     return tree
 
 
-def extract_text(nltk_tree: nltk.tree.tree.Tree) -> str:
+def extract_text(nltk_tree: 'nltk.tree.tree.Tree') -> str:
     """
     Extract sentence text (without commas so that it can be written into a csv)
     :param nltk_tree: nltk-tree object with C-structure
     :return: sentence string
     """
-    leaves = nltk_tree.leaves()
+    return format_text(nltk_tree.leaves())
+
+
+def extract_text_from_terminals(sentence: xml.etree.ElementTree.Element) -> str:
+    """
+    Extract sentence text directly from the word terminals (in document
+    order), without building the c-structure tree. Gives the same string as
+    extract_text.
+    :param sentence: sentence tree in xml
+    :return: sentence string
+    """
+    words = [t_node.attrib['word'] for t_node in sentence[0][0]  # terminals
+             if t_node.attrib.get('word', '--') != '--']
+    return format_text(words)
+
+
+def format_text(leaves: list) -> str:
+    """
+    Join words into sentence text (without commas so that it can be written
+    into a csv)
+    :param leaves: words of the sentence in order
+    :return: sentence string
+    """
     punctuation = set(string.punctuation)
     text = ''.join(w if set(w) <= punctuation else ' ' + w for w in leaves).lstrip()
     text = text.replace('« ', '«').replace(' »', '»')
@@ -182,16 +455,92 @@ def find_pred(sentence: xml.etree.ElementTree.Element,
             if m is not None:
                 pred_values.append(t_node.attrib['val'])
                 pro_f_levels.append(m.group(1))
+    if not pro_f_levels:
+        record_failure('find_pred', 'no eligible PRED value')
     if verbose:
         print(f"INFO: pro_f_levels: {pro_f_levels}")
         print(f"INFO: corresponding pred_values: {pred_values}")
     return pro_f_levels, pred_values
 
 
+def build_f_index(sentence: xml.etree.ElementTree.Element,
+                  verbose: bool = verbose_default) -> dict:
+    """
+    Index the f-structure of a sentence in one pass over its nodes, so that
+    the path extraction steps do not have to scan all non-terminals and edges
+    again for every lookup.
+    Only f-structure non-terminals are indexed (c-structure edges never carry
+    f-structure labels).
+
+    :param sentence: sentence tree in xml
+    :param verbose: information message output switch
+    :return: dict with
+                'parents': idref -> list of (parent id, label) of the edges
+                           pointing to it, in document order
+                'edges':   label -> list of (parent id, idref) of the edges
+                           with that label, in document order
+                'clauses': f-level id -> value of its STMT-TYPE/CLAUSE-TYPE
+    """
+    parents = dict()
+    edges = dict()
+    clauses = dict()
+    for t_node in sentence[0][0]:  # terminals
+        t_id = t_node.attrib['id']
+        if t_id.endswith('STMT-TYPE'):
+            clauses[t_id[:-10]] = t_node.attrib['val']  # not including '_STMT-TYPE' at the end
+        elif t_id.endswith('CLAUSE-TYPE'):
+            clauses[t_id[:-12]] = t_node.attrib['val']  # not including '_CLAUSE-TYPE' at the end
+    for nt_node in sentence[0][1]:  # non-terminals
+        nt_id = nt_node.attrib['id']
+        if 'f' not in nt_id:  # c-structure node
+            continue
+        for nt_edge in nt_node:
+            label = nt_edge.attrib['label']
+            idref = nt_edge.attrib['idref']
+            if idref not in parents:
+                parents[idref] = [(nt_id, label)]
+            else:
+                parents[idref].append((nt_id, label))
+            if label not in edges:
+                edges[label] = [(nt_id, idref)]
+            else:
+                edges[label].append((nt_id, idref))
+    if verbose:
+        print(f"INFO: indexed {len(parents)} f-structure nodes,",
+              f"{len(clauses)} clause types")
+    return {'parents': parents, 'edges': edges, 'clauses': clauses}
+
+
+def find_parent(f_index: dict,
+                current_level: str,
+                position: str = None) -> tuple:
+    """
+    Look up the f-structure non-terminal embedding current_level.
+    If several non-terminals point to current_level, the last one in document
+    order is taken, with its first edge (restricted to label position, if
+    given).
+
+    :param f_index: index as returned by build_f_index
+    :param current_level: id of the embedded f-level
+    :param position: edge label the parent has to point with (optional)
+    :return: parent id and edge label ('' and '' if there is no parent)
+    """
+    parent_id = ''
+    label = ''
+    for p_id, p_label in f_index['parents'].get(current_level, ()):
+        if position is not None and p_label != position:
+            continue
+        if p_id != parent_id:
+            parent_id = p_id
+            label = p_label
+    return parent_id, label
+
+
 def find_edges(sentence: xml.etree.ElementTree.Element,
                f_levels: list,
-               pred_values: list, 
+               pred_values: list,
                dependency_type: str = "TOPIC-REL",
+               f_index: dict = None,
                verbose: bool = verbose_default) \
     -> tuple:
     """
@@ -211,19 +560,25 @@ def find_edges(sentence: xml.etree.ElementTree.Element,
     :param f_levels: a list returned by find_pred 
                         (list of number strings)
     :param dependency_type: target dependency type
-    :return: dict with edge ids as keys and corresponding pred labels as values 
+    :param f_index: index as returned by build_f_index (built if not given)
+    :return: dict with edge ids as keys and corresponding pred labels as values
                 These edges indicate the target dependency type
-             list of truncation points
+             list of truncation points, one per edge (in the order of the
+                dict)
     """
+    if f_index is None:
+        f_index = build_f_index(sentence)
     edges = dict()
     truncation_points = list()
-    for nt_node in sentence[0][1]:  # non-terminal nodes
-        for nt_edge in nt_node:     # edges of non-terminal nodes
-            if nt_edge.attrib['label'] == dependency_type: # dependency check
-                for index, f in enumerate(f_levels):
-                    if nt_edge.attrib['idref'].endswith(f):   # level check  
-                        truncation_points.append(nt_node.attrib['id'])         # node is truncation point
-                        edges[nt_edge.attrib['idref']] = pred_values[index]    # and has the right pred value ("pro")
+    for nt_id, idref in f_index['edges'].get(dependency_type, ()):  # dependency check
+        for index, f in enumerate(f_levels):
+            if idref.endswith('_' + f):   # level check (f_5 is not f_15)
+                if idref not in edges:
+                    truncation_points.append(nt_id)     # node is truncation point
+                edges[idref] = pred_values[index]       # and has the right pred value ("pro")
+    if f_levels and not edges:
+        record_failure('find_edges', f'no {dependency_type} edge to an '
+                                     'eligible PRED')
     if verbose:
         print(f"INFO: pro under {dependency_type} and higher levels: {edges}")
         print(f"INFO: Truncation points: {truncation_points}")
@@ -233,40 +588,47 @@ def find_edges(sentence: xml.etree.ElementTree.Element,
 def find_syntactic_position(sentence: xml.etree.ElementTree.Element, 
                             f_level: str,
                             pred_value: str,
+                            f_index: dict = None,
                             verbose:bool = verbose_default) -> str:
     """
-    Find the syntactic position of PRED f-structure non-terminal on level 
+    Find the syntactic position of PRED f-structure non-terminal on level
     f_level with value pred_value.
-    Check all non-terminals on level f_level if their label is one from 
+    Check all non-terminals on level f_level if their label is one from
     eligible_labels.
-    
+
     :param sentence: sentence tree in xml
     :param f_level: f-level of pro under a dependency (str)
     :param pred_value: corresponding pred value (str)
+    :param f_index: index as returned by build_f_index (built if not given)
     :return: syntactic position (str)
     """
     eligible_labels = ['SUBJ', 'OBJ', 'ADJUNCT', 'PREDLINK', 'OBL-TH']
     adjunct_pred_values = ['hvor', 'hvorfor', 'hvordan', 'når']
     position = ''
-    
-    for nt_node in sentence[0][1]:  # non-terminals
-        for nt_edge in nt_node:     # nt edges
-            if (nt_edge.attrib['idref'] == f_level and
-                nt_edge.attrib['label'] in eligible_labels):
-                position = nt_edge.attrib['label']
+    pro_label = ''
+
+    if f_index is None:
+        f_index = build_f_index(sentence)
+    for _, label in f_index['parents'].get(f_level, ()):
+        pro_label = label
+        if label in eligible_labels:
+            position = label
     if position == '':  # if position is not found or not in labels
         if verbose:
             print("WARNING [find_f_labels.find_syntactic_position]:"
                   "Syntactic position of 'pro' could not be found or the",
                   f"associated label is none of {eligible_labels}.",
                   f"f_level: {f_level}, pred_value: {pred_value},",
-                  f"label of pro: {nt_edge.attrib['label']}.")
-        failing_labels.append(nt_edge.attrib['label'])
+                  f"label of pro: {pro_label}.")
+        failing_labels.append(pro_label)
         if pred_value in adjunct_pred_values:
             position = 'ADJUNCT'
+            record_failure('find_syntactic_position',
+                           'label not eligible, ADJUNCT assigned')
             if verbose:
                 print("INFO: Assigning ADJUNCT to position")
         else:
+            record_failure('find_syntactic_position', 'label not eligible')
             print("ERROR [find_f_labels.find_syntactic_position]:"
                   'An unknown error occurred. Probably, the sentence is a',
                   'rhetorical question.')
@@ -276,159 +638,169 @@ def find_syntactic_position(sentence: xml.etree.ElementTree.Element,
 def find_embedding_level_recursive(sentence: xml.etree.ElementTree.Element, 
                                    current_level: str, 
                                    initial_position = None,
-                                   verbose: bool = verbose_default) -> str:
+                                   f_index: dict = None,
+                                   chain_cache: dict = None,
+                                   verbose: bool = verbose_default) -> list:
     """
     Identify path from current_level to its embedding level:
-    For all f-structure non-terminals, identify edges on current level.
-    If an edge is the initial position of the search, we have found its parent,
-    the non-terminal whose edge we are looking at at the moment. Now, continue
-    with the parent as the new current_level, until TOP is reached. 
-    Not setting the initial_position variable again after entering the 
+    Look up the f-structure non-terminal with an edge on current level.
+    If an edge is the initial position of the search, we have found its parent.
+    Now, continue with the parent as the new current_level, until TOP is
+    reached.
+    Not setting the initial_position variable again after entering the
     recursion takes the first available edge.
-    
+    The levels above current_level are walked iteratively. The parent step of
+    every level with a path to TOP is stored in chain_cache, so that other
+    dependencies of the same sentence that share upper levels can reuse them.
+    A walk that comes back to a level it has already passed (a cyclic
+    f-structure, or a level without parent) raises a RecursionError right
+    away.
+
     :param initial_position: nt edge label identifying search starting point
     :param sentence: sentence tree in xml
     :param cur_level: id of the current f-level (embedded; string)
-    :return: path from the embedded level to the higher embedding level (f0; string)
+    :param f_index: index as returned by build_f_index (built if not given)
+    :param chain_cache: per-sentence dict level -> (parent level, label of
+                        the edge from the parent) for the levels with a path
+                        to TOP (None for TOP, False if there is no path)
+    :return: path from the embedded level up to the highest embedding level
+             (f0, not included), as a list of (f-level, label of the edge
+             embedding it) records
     """
     if verbose:
         print("INFO: Find embedding level recursively")
         print(f"INFO: Current level: {current_level}")
     if current_level.endswith('f_0'):
-        return 'TOP'
-    else:
-        parent_id = ''
-        label = ''
-        for nt_node in sentence[0][1]:  # non-terminals
-            if 'f' in nt_node.attrib['id']:  # test if in f-structure
-                for nt_edge in nt_node:
-                    if nt_edge.attrib['idref'] == current_level:  # ignore adjunct cases
-                        if initial_position is not None:
-                            if nt_edge.attrib['label'] == initial_position:
-                                label = nt_edge.attrib['label']
-                                parent_id = nt_node.attrib['id']
-                                if verbose:
-                                    print("INFO: Found parent.",
-                                          f"parent_id: {parent_id}")
-                                break
-                        else:
-                            label = nt_edge.attrib['label']
-                            parent_id = nt_node.attrib['id']
-                            break
-        return str(current_level + ', ' + label) + ' <- ' + \
-            find_embedding_level_recursive(sentence=sentence, 
-                                           current_level=parent_id)
+        return []
+    if f_index is None:
+        f_index = build_f_index(sentence)
+    if chain_cache is None:
+        chain_cache = dict()
+    parent_id, label = find_parent(f_index, current_level, initial_position)
+    if verbose and initial_position is not None and parent_id != '':
+        print("INFO: Found parent.", f"parent_id: {parent_id}")
+    path = [(current_level, label)]
+
+    # walk up from the parent until TOP or a level with a known path
+    first_level = parent_id
+    walked = list()  # (level, parent level, label) records
+    visited = set()
+    level = parent_id
+    error = None
+    while level not in chain_cache:
+        if level.endswith('f_0'):
+            chain_cache[level] = None
+            break
+        if level == '':
+            error = 'level without parent'
+            record_failure('find_embedding_level_recursive', error)
+        elif level in visited:
+            error = f'cyclic f-structure at level {level}'
+            record_failure('find_embedding_level_recursive',
+                           'cyclic f-structure')
+        if error is not None:
+            break
+        visited.add(level)
+        parent_id, label = find_parent(f_index, level)
+        walked.append((level, parent_id, label))
+        level = parent_id
+    if chain_cache.get(level, False) is False:
+        if error is None:
+            record_failure('find_embedding_level_recursive',
+                           'known dead end')
+        for walked_level, _, _ in walked:
+            chain_cache[walked_level] = False
+        raise RecursionError('No path to TOP from ' + current_level + ': ' +
+                             (error or 'known dead end'))
+    for walked_level, parent_id, label in walked:
+        chain_cache[walked_level] = (parent_id, label)
+    level = first_level
+    while chain_cache[level] is not None:
+        parent_id, label = chain_cache[level]
+        path.append((level, label))
+        level = parent_id
+    if verbose:
+        print(f"INFO: path: {path}")
+    return path
 
 
 def find_clause_type_modify_path(sentence: xml.etree.ElementTree.Element,
-                                 path,
-                                 verbose: bool = verbose_default) -> str:
+                                 path: list,
+                                 f_index: dict = None,
+                                 verbose: bool = verbose_default) -> list:
     """
-    Extract the clause type information from the previously extracted path from
-    syntactical PRED position to TOP. Then, return the subpath from syntactical
-    PRED position to the dependency filler.
+    Add the clause type information to the previously extracted path from
+    syntactical PRED position to TOP.
     
     :param sentence: sentence tree in xml
     :param path: path as returned by recursive embedding level search
-    :return: new path (list)
+    :param f_index: index as returned by build_f_index (built if not given)
+    :return: new path, as a list of (f-level, label, clause type) records
+             (clause type None if the level has none)
     """
+    if f_index is None:
+        f_index = build_f_index(sentence)
+    clauses = f_index['clauses']  # label = f_level_tail, value = type of the clause/ statement
+    new_path = [(id_node, label, clauses.get(id_node))
+                for id_node, label in path]
     if verbose:
-        print('INFO: path: ', path)
-    new_path = {}
-    path_elements = path[:-7].split(' <- ')  # list of strings of a format  's3392_0_f_7, SUBJ'; ' <- TOP' excluded
-    if verbose:
-        print('INFO: path elements: ', path_elements)
-    clauses = {}  # label = f_level_tail, value = type of the clause/ statement
-    for t_node in sentence[0][0]:  # terminals
-        if t_node.attrib['id'].endswith('STMT-TYPE'):
-            clauses[t_node.attrib['id'][:-10]] = t_node.attrib['val']  # not including '_STMT-TYPE' at the end
-        elif t_node.attrib['id'].endswith('CLAUSE-TYPE'):
-            clauses[t_node.attrib['id'][:-12]] = t_node.attrib['val']  # not including '_CLAUSE-TYPE' at the end
-    if verbose:
-        print('INFO: clause labels: ', clauses.keys())  # resulting format: s2977_7_f_0', 's2977_7_f_32' (like f-levels)
-    for el in path_elements:  # strings of a format 's3392_0_f_7, SUBJ'
-        id_node, label = el.split(', ')  # dividing string
-        hit = [id_node == key for key in clauses.keys()]  # list of size n = len(clauses) with bool
-        if any(hit):  # if bool == True (id in keys of clauses dict)
-            hit_idx = hit.index(True)  # get the index of an element of clauses dict where it's the case
-            new_label = label + '_' + list(clauses.items())[hit_idx][1]  # modify the label with clause info
-        else:
-            new_label = label
-        new_path[new_label] = id_node
-    if verbose:
-        print('INFO: new path: ', new_path.items())
+        print('INFO: new path: ', new_path)
     return new_path
 
 
 def truncate_path(truncation_point,
-                  long_modified_path,
-                  verbose:bool = verbose_default) -> str:
+                  long_modified_path: list,
+                  verbose:bool = verbose_default) -> list:
     """
     Shorten the path to the level embedding the dependency filler.
     
-    :param long_modified_path:
+    :param long_modified_path: path as returned by
+                               find_clause_type_modify_path
     :param truncation_point: f-level that embeds dependency filler (end point
                                    for trucated path)
-    :return: new truncated path (string)
+    :return: new truncated path (list of records)
     """
     if verbose:
         print("INFO: Truncating path.")
         print(f"INFO: truncation_point: {truncation_point}")
-    new_path = ''
-    hit = [truncation_point in value for value in long_modified_path.values()]
+    for hit_idx, (id_node, _, _) in enumerate(long_modified_path):
+        if id_node == truncation_point:  # the lowest index (first match)
+            return long_modified_path[:hit_idx]
+    if truncation_point.endswith('f_0'):  # 0 f-lvl is not included into the long path, the old path should be correct
+        return long_modified_path
+    record_failure('truncate_path', 'truncation point not in path')
     if verbose:
-        print(f'INFO: hit: {hit}')
-    if any(hit):
-        hit_idx = hit.index(True)  # returns the lowest index (first match)
-        for i in range(hit_idx):
-            label = list(long_modified_path.keys())[i]
-            new_path += label
-            new_path += ' '
-    else:
-        if truncation_point.endswith('0'):  # 0 f-lvl is not included into the long path, the old path should be correct
-            new_path = ' '.join(list(long_modified_path.keys()))  # old path; joining the keys of that dict with a space
-            if verbose:
-                print(f"INFO: truncated path: {new_path}")
-        else:
-            if verbose:
-                print('WARNING [find_f_labels.truncate_path]:',
-                      'Truncation point is not in long path.',
-                      "long path: ", long_modified_path,
-                      f"truncation point: {truncation_point}")
-    return new_path
+        print('WARNING [find_f_labels.truncate_path]:',
+              'Truncation point is not in long path.',
+              "long path: ", long_modified_path,
+              f"truncation point: {truncation_point}")
+    return []
 
 
-def clean_path(truncated_path: str,
-               verbose:bool = verbose_default) -> str:
+def clean_path(truncated_path: list,
+               verbose:bool = verbose_default) -> list:
     """
     Clean the path with labels by removing $-labels and modifying labels 
-    with phrase structure information.
+    with phrase structure information: the clause type of a set member
+    ($_type) is moved to the label of the set above it.
     :param truncated_path: path as returned by truncate_path
-    :return: cleaned path (string)
+    :return: cleaned path (list of labels)
     """
     if verbose:
         print('INFO: Cleaning path')
         print(f'INFO: Truncated path: {truncated_path}')
-    if '$' in truncated_path:  # braces are in the f-structure and '$' is in path
-        idx = [i.start() for i in list(re.finditer('\\$', truncated_path))]  # list of all indexes of '$'
-        labels_with_ranges = {(el.start(), el.end()): truncated_path[el.start():el.end()]  # dict of path elements
-                              for el in re.finditer(r'\S+', truncated_path)}              # with their positions as keys
-        if verbose:
-            print(f'INFO: labels_with_ranges: {labels_with_ranges}')
-        new_dict = dict(labels_with_ranges)
-        for rang, label in labels_with_ranges.items():
-            if rang[0] in idx:
-                if rang[0] + 1 != rang[1]:  # if it contains clause type info
-                    tail = label[1:]
-                    next_el_start = rang[1] + 1
-                    next_tuple = [(k, v) for k, v in labels_with_ranges.items() if k[0] == next_el_start][0]
-                    new_dict[next_tuple[0]] = next_tuple[1] + tail  # changing the new dictionary
-                    new_dict.pop(rang)
-                else:  # if it does not contain clause type info, we just remove it
-                    new_dict.pop(rang)
-        new_path = ' '.join(list(new_dict.values()))
-    else:
-        new_path = truncated_path
+    new_path = list()
+    tail = ''
+    for i, (_, label, clause_type) in enumerate(truncated_path):
+        if clause_type is not None:
+            label = label + '_' + clause_type  # modify the label with clause info
+        if label.startswith('$'):  # braces are in the f-structure
+            if len(label) > 1 and i + 1 == len(truncated_path):
+                raise IndexError('No label above ' + label)
+            tail = label[1:]  # clause type info, if any
+            continue
+        new_path.append(label + tail)
+        tail = ''
     if verbose:
         print(f'INFO: cleaned path: {new_path}')
     return new_path
@@ -439,6 +811,8 @@ def analyze_one_dependency(sentence: xml.etree.ElementTree.Element,
                            f_level: str,
                            pred_value: str,
                            sentence_str: str,
+                           f_index: dict = None,
+                           chain_cache: dict = None,
                            verbose:bool = verbose_default) -> str:
     """
     Analyze one FG-dependency of a sentence, returning as formatted str.
@@ -453,6 +827,9 @@ def analyze_one_dependency(sentence: xml.etree.ElementTree.Element,
     :param f_level: f-structure level of pred with value pred_value under target dependency
     :param pred_value: target value of pred f-structure non-terminal
     :param sentence_str: sentence text for easier lookup
+    :param f_index: index as returned by build_f_index (built if not given)
+    :param chain_cache: per-sentence cache of paths to TOP, shared by the
+                        dependencies of a sentence
     :param verbose: information message output switch
     :return: info as str
     """
@@ -460,94 +837,864 @@ def analyze_one_dependency(sentence: xml.etree.ElementTree.Element,
         print('INFO: Analyzing dependency.')
         
     _, _, sentence_id = get_IDs(sentence)
-    cleaned_path = ''
-    truncated_path = ''
-    position = find_syntactic_position(sentence, f_level, pred_value)
+    if f_index is None:
+        f_index = build_f_index(sentence)
+    cleaned_path = list()
+    position = find_syntactic_position(sentence, f_level, pred_value,
+                                       f_index=f_index)
     if position != '':
         try:
-            path = find_embedding_level_recursive(sentence, f_level, position)
-            modified_path = find_clause_type_modify_path(sentence, path)
+            path = find_embedding_level_recursive(sentence, f_level, position,
+                                                  f_index=f_index,
+                                                  chain_cache=chain_cache)
+            modified_path = find_clause_type_modify_path(sentence, path,
+                                                         f_index=f_index)
             truncated_path = truncate_path(truncation_point, modified_path)
             try:
                 cleaned_path = clean_path(truncated_path)
                 worked_ids.append(sentence_id + '\n')
             except IndexError:
+                record_failure('clean_path', 'index error')
                 print('ERROR [find_f_labels.analyze_one_dependency]:',
                       'Index error when cleaning the path')
-        except RecursionError:
+        except RecursionError as error:
             print('ERROR [find_f_labels.analyze_one_dependency]:',
-                  'Recursion error when finding the path.')
+                  'Recursion error when finding the path.', error)
     else:
         if verbose:
             print('WARNING [find_f_labels.analyze_one_dependency]:',
                   'Pro position not found for:\n', sentence_str, '\n')
-    cleaned_path = ' '.join(list(reversed(cleaned_path.split())))
+    cleaned_path = ' '.join(reversed(cleaned_path))
     return position + ',' + cleaned_path + '\n'
 
 
-def main():
-    verbose = verbose_default
-    
-    xml_filename = 'rc_example.xml'
-    folder = "examples"
-    
-    folder_path = os.path.abspath(folder)
-    xml_filename = folder_path + os.path.sep + xml_filename
-        
-    # parse sentences
-    with open(xml_filename, encoding='utf-8') as file:
-        sentences = split_sentences(file)
-    
-    # initialize content to write to output file
-    out = list()
-    out.append('web_id,sent_id,graph_id,text,pro_position,cleaned_path\n')
-    
-    if verbose:
-        print("INFO: Starting sentence analysis.")
-    
-    for sentence in sentences:   
-        ### c-structure steps - easiest for sentence text extraction
-        web_id, graph_id, sentence_id = get_IDs(sentence)
+# output file names of the dependency types (see main)
+dependency_names = {'TOPIC-REL': 'rc', 'FOCUS-INT': 'wh'}
+
+
+def analyze_dependencies(sentence: xml.etree.ElementTree.Element,
+                         dependency_types: list = ('TOPIC-REL',),
+                         text: str = 'terminals',
+                         verbose: bool = verbose_default) -> dict:
+    """
+    Run the c-structure and f-structure steps on one sentence, for one or
+    more dependency types at once. The sentence text, the eligible PRED
+    values, the f-structure index and the paths to TOP are shared by all
+    dependency types.
+    :param sentence: sentence tree in xml
+    :param dependency_types: dependency types to extract (e.g. TOPIC-REL and
+                             FOCUS-INT)
+    :param text: how to get the sentence text:
+                    'terminals'   - from the word terminals
+                    'c-structure' - from the nltk tree of the c-structure
+                    'none'        - skip it (empty text column)
+    :param verbose: information message output switch
+    :return: dict dependency type -> output lines (csv rows) for the sentence
+    """
+    web_id, graph_id, sentence_id = get_IDs(sentence)
+    if text == 'terminals':
+        sentence_str = extract_text_from_terminals(sentence)
+    elif text == 'c-structure':
+        ### c-structure steps
         graph, node_ids, node_names = create_graph(sentence)
         root_name = sentence[0][1][0].attrib['cat'] # root node label as string
         root_node_id = node_ids[root_name]
         nltk_tree = convert_graph_to_nltk_tree(graph, root_node_id)
         sentence_str = extract_text(nltk_tree)
-        if verbose:
-            print(f"INFO: Sentence text: {sentence_str}")
+    elif text == 'none':
+        sentence_str = ''
+    else:
+        raise ValueError(f"Unknown text mode: {text}")
+    if verbose:
+        print(f"INFO: Sentence text: {sentence_str}")
 
-        ### f-structure steps
-        
-        # Find all PRED f-structure terminals that have one of the eligible values.
-        pro_f_levels, pred_values = \
-            find_pred(sentence, 
-                      eligible_values = ['pro', 'hvor', 'hvorfor', 'hvordan', 
-                                         'når'])
+    ### f-structure steps
+    
+    # Find all PRED f-structure terminals that have one of the eligible values.
+    pro_f_levels, pred_values = \
+        find_pred(sentence, 
+                  eligible_values = ['pro', 'hvor', 'hvorfor', 'hvordan', 
+                                     'når'])
+    # Index the f-structure once; the steps below only query the index.
+    f_index = build_f_index(sentence)
+    
+    line = f"{web_id},{sentence_id},{graph_id},{sentence_str},"
+    
+    # paths to TOP are shared between the dependencies of the sentence
+    chain_cache = dict()
+    results = dict()
+    for dependency_type in dependency_types:
         # Find all f-structure edges on previously found levels with the 
         # specific dependency type under investigation.
         edges, truncation_points = \
             find_edges(sentence, pro_f_levels, pred_values, 
-                       dependency_type = "TOPIC-REL")
-        
-        line = f"{web_id},{sentence_id},{graph_id},{sentence_str},"
-        
-        if len(edges) == 1: # analyzing only one dependency for now
-            k = 0
-        # for k, edge in enumerate(edges):
+                       dependency_type=dependency_type, f_index=f_index)
+        lines = list()
+        for k, (f_level, pred_value) in enumerate(edges.items()):
             result = analyze_one_dependency(sentence,
                                             truncation_point =
                                                 truncation_points[k],
-                                            f_level=list(edges.keys())[k],
-                                            pred_value=pred_values[k],
-                                            sentence_str=sentence_str)
-            out.append(line + result)
+                                            f_level=f_level,
+                                            pred_value=pred_value,
+                                            sentence_str=sentence_str,
+                                            f_index=f_index,
+                                            chain_cache=chain_cache)
+            lines.append(line + result)
             if verbose:
-                print(f"INFO: Analysis result: {line}\n\n")
-    filename = xml_filename.replace('xml', 'csv')
-    write_file(filename, out)
-    return out
+                print(f"INFO: Analysis result ({dependency_type}):",
+                      f"{line + result}\n\n")
+        results[dependency_type] = lines
+    return results
+
+
+def analyze_sentence(sentence: xml.etree.ElementTree.Element,
+                     text: str = 'terminals',
+                     verbose: bool = verbose_default,
+                     dependency_type: str = 'TOPIC-REL') -> list:
+    """
+    Run the c-structure and f-structure steps on one sentence.
+    :param sentence: sentence tree in xml
+    :param text: how to get the sentence text, see analyze_dependencies
+    :param verbose: information message output switch
+    :param dependency_type: dependency type to extract
+    :return: output lines (csv rows) for the sentence
+    """
+    return analyze_dependencies(sentence, [dependency_type], text=text,
+                                verbose=verbose)[dependency_type]
+
+
+def iter_sentence_xml(xml_file, block_size: int = 1 << 20) -> iter:
+    """
+    Cut the raw xml of each sentence (<s ...> ... </s>) out of the corpus file
+    without parsing it, so that the parsing can be left to worker processes.
+    The xml declaration of the file is put in front of every sentence, so
+    each piece can be parsed on its own with the right encoding.
+    :param xml_file: tiger xml-file opened in binary mode
+    :param block_size: number of bytes read at a time
+    :return: generator of sentence xml (bytes)
+    """
+    buffer = xml_file.read(max(block_size, 1024))  # whole declaration
+    declaration = b''
+    head = buffer.lstrip(b'\xef\xbb\xbf')  # utf-8 byte order mark
+    if head.startswith(b'<?xml'):
+        declaration = head[:head.index(b'?>') + 2]
+    while True:
+        pos = 0
+        while True:
+            m = sentence_start.search(buffer, pos)
+            if m is None:
+                pos = max(pos, len(buffer) - 2)  # keep a possibly cut '<s'
+                break
+            end = buffer.find(b'</s>', m.start())
+            if end == -1:
+                pos = m.start()
+                break
+            pos = end + 4
+            yield declaration + buffer[m.start():pos]
+        block = xml_file.read(block_size)
+        if not block:
+            break
+        buffer = buffer[pos:] + block
+
+
+def analyze_chunk(chunk: list, text: str = 'terminals',
+                  profile: bool = False,
+                  dependency_types: list = ('TOPIC-REL',)) -> tuple:
+    """
+    Worker function for the parallel extraction: parse and analyze a chunk of
+    sentences in a separate process. The module-level failing_labels and
+    worked_ids lists are used as per-chunk accumulators here and handed back
+    to the main process.
+    :param chunk: list of sentence xml as returned by iter_sentence_xml
+    :param text: text mode, see analyze_sentence
+    :param profile: profile the chunk (see enable_profiling)
+    :param dependency_types: dependency types to extract
+    :return: output lines (dict dependency type -> lines), failing labels and
+             worked ids of the chunk, the
+             number of sentences in it and the profiling report of the chunk
+             (None if not profiled)
+    """
+    del failing_labels[:]
+    del worked_ids[:]
+    if profile:
+        enable_profiling()
+    try:
+        lines = {dependency_type: list()
+                 for dependency_type in dependency_types}
+        for sentence_xml in chunk:
+            results = analyze_dependencies(ET.fromstring(sentence_xml),
+                                           dependency_types, text=text)
+            for dependency_type, type_lines in results.items():
+                lines[dependency_type].extend(type_lines)
+        report = profiler.report() if profile else None
+    finally:
+        if profile:
+            disable_profiling()
+    return lines, list(failing_labels), list(worked_ids), len(chunk), report
+
+
+def analyze_parallel(xml_file,
+                     processes: int,
+                     chunk_size: int = 200,
+                     text: str = 'terminals',
+                     profile: bool = False,
+                     dependency_types: list = ('TOPIC-REL',)) -> iter:
+    """
+    Analyze the sentences of a corpus file in a process pool. Chunks are
+    submitted in corpus order and their results are handed out in the same
+    order; only a few chunks per process are in flight at a time, so the
+    corpus is never read ahead entirely.
+    :param xml_file: tiger xml-file opened in binary mode
+    :param processes: number of worker processes
+    :param chunk_size: number of sentences per chunk
+    :param text: text mode, see analyze_sentence
+    :param profile: profile the chunks (see analyze_chunk)
+    :param dependency_types: dependency types to extract
+    :return: generator of analyze_chunk results, one per chunk
+    """
+    import multiprocessing
+    from collections import deque
+    pending = deque()
+    chunk = list()
+    with multiprocessing.Pool(processes) as pool:
+        for sentence_xml in iter_sentence_xml(xml_file):
+            chunk.append(sentence_xml)
+            if len(chunk) < chunk_size:
+                continue
+            pending.append(pool.apply_async(analyze_chunk,
+                                            (chunk, text, profile,
+                                             dependency_types)))
+            chunk = list()
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        if chunk:
+            pending.append(pool.apply_async(analyze_chunk,
+                                            (chunk, text, profile,
+                                             dependency_types)))
+        while pending:
+            yield pending.popleft().get()
+
+
+def analyze_sentence_xml(sentence_xml: bytes,
+                         text: str = 'terminals',
+                         dependency_types: list = ('TOPIC-REL',)) -> dict:
+    """
+    Parse and analyze one sentence, keeping its diagnostics apart: the
+    entries it adds to failing_labels and worked_ids are moved to the result
+    (the caller adds them back in corpus order).
+    :param sentence_xml: sentence xml as returned by iter_sentence_xml
+    :param text: text mode, see analyze_dependencies
+    :param dependency_types: dependency types to extract
+    :return: dict with the output lines ('rows', dict dependency type ->
+             lines) and the 'failing_labels' and 'worked_ids' of the sentence
+    """
+    n_labels = len(failing_labels)
+    n_ids = len(worked_ids)
+    rows = analyze_dependencies(ET.fromstring(sentence_xml), dependency_types,
+                                text=text)
+    result = {'rows': rows,
+              'failing_labels': failing_labels[n_labels:],
+              'worked_ids': worked_ids[n_ids:]}
+    del failing_labels[n_labels:]
+    del worked_ids[n_ids:]
+    return result
+
+
+def analyze_sentences_xml(sentences: list,
+                          text: str = 'terminals',
+                          dependency_types: list = ('TOPIC-REL',),
+                          profile: bool = False) -> tuple:
+    """
+    Worker function for analyze_cached: analyze a list of sentences with
+    analyze_sentence_xml in a separate process.
+    :param sentences: list of sentence xml as returned by iter_sentence_xml
+    :param text: text mode, see analyze_dependencies
+    :param dependency_types: dependency types to extract
+    :param profile: profile the sentences (see enable_profiling)
+    :return: list of results as returned by analyze_sentence_xml, and the
+             profiling report of the sentences (None if not profiled)
+    """
+    if profile:
+        enable_profiling()
+    try:
+        results = [analyze_sentence_xml(sentence_xml, text, dependency_types)
+                   for sentence_xml in sentences]
+        report = profiler.report() if profile else None
+    finally:
+        if profile:
+            disable_profiling()
+    return results, report
+
+
+class SentenceCache:
+    """
+    Persistent cache of the extraction results of a corpus, one entry per
+    sentence id (an sqlite file). An entry is valid as long as the digest of
+    the sentence xml and the extraction settings (including cache_version)
+    is the same, so a re-run only analyzes new and changed sentences.
+    """
+
+    def __init__(self, filename: str, settings: dict):
+        """
+        :param filename: path of the cache file (created if missing)
+        :param settings: extraction settings the results depend on
+        """
+        import sqlite3
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS sentences '
+                                '(sentence_id TEXT PRIMARY KEY, '
+                                'digest TEXT NOT NULL, result TEXT NOT NULL)')
+        settings = dict(settings, version=cache_version)
+        self.settings = json.dumps(settings, sort_keys=True).encode('utf-8')
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, sentence_xml: bytes) -> tuple:
+        """
+        :param sentence_xml: sentence xml as returned by iter_sentence_xml
+        :return: sentence id (the digest if the sentence has none) and digest
+                 of the sentence xml and the settings
+        """
+        digest = hashlib.blake2b(self.settings + b'\0' + sentence_xml,
+                                 digest_size=16).hexdigest()
+        m = sentence_id_pattern.search(sentence_xml)
+        sentence_id = m.group(1).decode('utf-8') if m else digest
+        self.seen.add(sentence_id)
+        return sentence_id, digest
+
+    def get(self, sentence_id: str, digest: str) -> dict:
+        """
+        :return: cached result (as returned by analyze_sentence_xml), or None
+                 if the sentence is new or has changed
+        """
+        row = self.connection.execute(
+            'SELECT digest, result FROM sentences WHERE sentence_id = ?',
+            (sentence_id,)).fetchone()
+        if row is not None and row[0] == digest:
+            self.hits += 1
+            return json.loads(row[1])
+        self.misses += 1
+        return None
+
+    def put(self, sentence_id: str, digest: str, result: dict) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO sentences VALUES (?, ?, ?)',
+            (sentence_id, digest, json.dumps(result)))
+
+    def prune(self) -> int:
+        """
+        Remove the entries of sentences not seen since the cache was opened
+        (call after a run over the whole corpus).
+        :return: number of removed entries
+        """
+        stale = [sentence_id for sentence_id, in self.connection.execute(
+                     'SELECT sentence_id FROM sentences')
+                 if sentence_id not in self.seen]
+        self.connection.executemany(
+            'DELETE FROM sentences WHERE sentence_id = ?',
+            [(sentence_id,) for sentence_id in stale])
+        return len(stale)
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
+
+
+def analyze_cached(xml_file,
+                   cache: SentenceCache,
+                   dependency_types: list = ('TOPIC-REL',),
+                   text: str = 'terminals',
+                   processes: int = 1,
+                   batch_size: int = 1000) -> iter:
+    """
+    Analyze the sentences of a corpus file, serving unchanged sentences from
+    the cache. Sentences are looked up a batch at a time; the new and changed
+    ones of a batch are analyzed (in a process pool if processes > 1, whose
+    profiling reports are merged into the profiler while profiling) and
+    stored, and the results of the batch are handed out in corpus order.
+    :param xml_file: tiger xml-file opened in binary mode
+    :param cache: SentenceCache of the corpus file
+    :param dependency_types: dependency types to extract
+    :param text: text mode, see analyze_dependencies
+    :param processes: number of worker processes for the analyzed sentences
+    :param batch_size: number of sentences looked up at a time
+    :return: generator of results as returned by analyze_sentence_xml, one
+             per sentence
+    """
+    pool = None
+    if processes > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+    try:
+        batch = list()
+        sentences = iter_sentence_xml(xml_file)
+        while True:
+            sentence_xml = next(sentences, None)
+            if sentence_xml is not None:
+                batch.append(sentence_xml)
+                if len(batch) < batch_size:
+                    continue
+            keys = [cache.key(sentence_xml) for sentence_xml in batch]
+            results = [cache.get(*key) for key in keys]
+            missing = [i for i, result in enumerate(results) if result is None]
+            if pool is not None:
+                size = max(len(missing) // (4 * processes), 1)
+                chunks = [[batch[i] for i in missing[k:k + size]]
+                          for k in range(0, len(missing), size)]
+                analyzed = list()
+                for chunk_results, report in pool.starmap(
+                        analyze_sentences_xml,
+                        [(chunk, text, dependency_types, profiler is not None)
+                         for chunk in chunks]):
+                    analyzed.extend(chunk_results)
+                    if report is not None:
+                        profiler.merge(report)
+            else:
+                analyzed = [analyze_sentence_xml(batch[i], text,
+                                                 dependency_types)
+                            for i in missing]
+            for i, result in zip(missing, analyzed):
+                results[i] = result
+                cache.put(*keys[i], result)
+            cache.connection.commit()
+            yield from results
+            batch = list()
+            if sentence_xml is None:
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def summarize_diagnostics(n_sentences: int, n_rows: int) -> dict:
+    """
+    Summarize the diagnostics collected in failing_labels and worked_ids.
+    :param n_sentences: number of analyzed sentences
+    :param n_rows: number of extracted dependencies
+    :return: summary dict
+    """
+    label_counts = dict()
+    for label in failing_labels:
+        label_counts[label] = label_counts.get(label, 0) + 1
+    return {'sentences': n_sentences,
+            'rows': n_rows,
+            'worked': len(worked_ids),
+            'failing_labels': label_counts}
+
+
+def expand_inputs(patterns: list) -> list:
+    """
+    :param patterns: corpus file names or glob patterns
+    :return: file names, the matches of each pattern in sorted order (a
+             pattern without matches is kept as it is)
+    """
+    filenames = list()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        filenames.extend(matches if matches else [pattern])
+    return filenames
+
+
+def output_filename(output: str, dependency_type: str,
+                    n_types: int = 1) -> str:
+    """
+    :param output: name of the output csv file
+    :param dependency_type: dependency type of the rows
+    :param n_types: number of extracted dependency types; with more than one,
+                    the type is added to the file name (e.g. out_rc.csv)
+    :return: name of the output file of the dependency type
+    """
+    if n_types == 1:
+        return output
+    name = dependency_names.get(dependency_type, dependency_type.lower())
+    return os.path.splitext(output)[0] + '_' + name + '.csv'
+
+
+def extract_file(xml_filename: str,
+                 dependency_types: list = ('TOPIC-REL',),
+                 streaming: bool = True,
+                 processes: int = 1,
+                 text: str = 'terminals',
+                 cache: bool = False,
+                 cache_dir: str = None,
+                 stats: dict = None,
+                 verbose: bool = verbose_default) -> iter:
+    """
+    Extract the FGD paths from one corpus file. The diagnostics are added to
+    failing_labels and worked_ids.
+    :param xml_filename: tiger xml-file, compressed or not (see open_corpus)
+    :param dependency_types: dependency types to extract
+    :param streaming: see main
+    :param processes: see main
+    :param text: see main
+    :param cache: see main
+    :param cache_dir: see main
+    :param stats: dict to add the counts of the file to ('sentences', and
+                  'cache_hits', 'cache_misses' and 'cache_removed' with the
+                  cache)
+    :param verbose: information message output switch
+    :return: generator of dicts dependency type -> output lines, in corpus
+             order (one per sentence, or per chunk of sentences)
+    """
+    if stats is None:
+        stats = dict()
+    stats.setdefault('sentences', 0)
+    with open_corpus(xml_filename) as file:
+        if cache:
+            if cache_dir is None:
+                cache_dir = os.path.join(os.path.dirname(xml_filename),
+                                         '.extraction_cache')
+            os.makedirs(cache_dir, exist_ok=True)
+            # the basename for readability, and a hash of the full path, so
+            # that corpora with the same name in different directories do
+            # not share a cache
+            path_hash = hashlib.blake2b(
+                os.path.abspath(xml_filename).encode('utf-8'),
+                digest_size=6).hexdigest()
+            sentence_cache = SentenceCache(
+                os.path.join(cache_dir, f'{os.path.basename(xml_filename)}.'
+                                        f'{path_hash}.sqlite'),
+                {'text': text, 'dependency_types': list(dependency_types)})
+            try:
+                for result in analyze_cached(file, sentence_cache,
+                                             dependency_types, text=text,
+                                             processes=processes):
+                    failing_labels.extend(result['failing_labels'])
+                    worked_ids.extend(result['worked_ids'])
+                    stats['sentences'] += 1
+                    yield result['rows']
+                removed = sentence_cache.prune()
+            finally:
+                sentence_cache.close()
+            for key, value in (('cache_hits', sentence_cache.hits),
+                               ('cache_misses', sentence_cache.misses),
+                               ('cache_removed', removed)):
+                stats[key] = stats.get(key, 0) + value
+            if verbose:
+                print(f"INFO: Cache: {sentence_cache.hits} sentences cached,",
+                      f"{sentence_cache.misses} analyzed,",
+                      f"{removed} removed")
+        elif processes > 1:
+            for chunk_lines, chunk_labels, chunk_ids, chunk_len, report in \
+                    analyze_parallel(file, processes, text=text,
+                                     profile=profiler is not None,
+                                     dependency_types=dependency_types):
+                failing_labels.extend(chunk_labels)
+                worked_ids.extend(chunk_ids)
+                stats['sentences'] += chunk_len
+                if report is not None:
+                    profiler.merge(report)
+                yield chunk_lines
+        else:
+            if streaming:
+                sentences = iter_sentences(file)
+            else:
+                sentences = split_sentences(file)
+            for sentence in sentences:
+                stats['sentences'] += 1
+                yield analyze_dependencies(sentence, dependency_types,
+                                           text=text, verbose=verbose)
+
+
+def extract_shard(xml_filename: str,
+                  dependency_types: list = ('TOPIC-REL',),
+                  streaming: bool = True,
+                  text: str = 'terminals',
+                  cache: bool = False,
+                  cache_dir: str = None,
+                  profile: bool = False) -> tuple:
+    """
+    Worker function for the concurrent extraction of several corpus files:
+    extract all paths of one file in a separate process (decompression and
+    parsing included). As in analyze_chunk, failing_labels and worked_ids
+    are per-file accumulators here and handed back to the main process.
+    :param xml_filename: tiger xml-file, compressed or not
+    :param dependency_types: dependency types to extract
+    :param streaming: see main
+    :param text: see main
+    :param cache: see main
+    :param cache_dir: see main
+    :param profile: profile the file (see enable_profiling)
+    :return: output lines (dict dependency type -> lines), failing labels and
+             worked ids of the file, its stats (see extract_file) and the
+             profiling report of the file (None if not profiled)
+    """
+    del failing_labels[:]
+    del worked_ids[:]
+    if profile:
+        enable_profiling()
+    try:
+        lines = {dependency_type: list()
+                 for dependency_type in dependency_types}
+        stats = dict()
+        start = time.perf_counter()
+        for results in extract_file(xml_filename, dependency_types,
+                                    streaming=streaming, text=text,
+                                    cache=cache, cache_dir=cache_dir,
+                                    stats=stats):
+            for dependency_type, type_lines in results.items():
+                lines[dependency_type].extend(type_lines)
+        stats['seconds'] = time.perf_counter() - start
+        report = profiler.report() if profile else None
+    finally:
+        if profile:
+            disable_profiling()
+    return lines, list(failing_labels), list(worked_ids), stats, report
+
+
+def extract_files(xml_filenames: list,
+                  dependency_types: list = ('TOPIC-REL',),
+                  streaming: bool = True,
+                  processes: int = 1,
+                  text: str = 'terminals',
+                  cache: bool = False,
+                  cache_dir: str = None,
+                  file_stats: list = None,
+                  verbose: bool = verbose_default) -> iter:
+    """
+    Extract the FGD paths from several corpus files, in the order of the
+    files. With more than one process and more than one file, the files are
+    extracted concurrently, one file per worker process (see extract_shard);
+    only a few files per process are in flight at a time, and their results
+    are handed out in file order, as in the serial run. A single file is
+    split into chunks of sentences instead (see extract_file).
+    :param xml_filenames: tiger xml-files, compressed or not
+    :param dependency_types: dependency types to extract
+    :param streaming: see main
+    :param processes: see main
+    :param text: see main
+    :param cache: see main
+    :param cache_dir: see main
+    :param file_stats: list to append the stats of every file to (dicts with
+                       'file', 'sentences', 'rows' per dependency type and
+                       'seconds', and the cache counts with the cache)
+    :param verbose: information message output switch
+    :return: generator of dicts dependency type -> output lines, in file and
+             corpus order
+    """
+    if file_stats is None:
+        file_stats = list()
+    if processes > 1 and len(xml_filenames) > 1:
+        import multiprocessing
+        from collections import deque
+
+        def collect(xml_filename, result):
+            lines, labels, ids, stats, report = result.get()
+            failing_labels.extend(labels)
+            worked_ids.extend(ids)
+            if report is not None:
+                profiler.merge(report)
+            file_stats.append(file_summary(xml_filename, stats, {
+                dependency_type: len(type_lines)
+                for dependency_type, type_lines in lines.items()}))
+            if verbose:
+                print('INFO: File:', file_stats[-1])
+            return lines
+
+        pending = deque()
+        with multiprocessing.Pool(min(processes, len(xml_filenames))) as pool:
+            for xml_filename in xml_filenames:
+                pending.append((xml_filename, pool.apply_async(
+                    extract_shard, (xml_filename, dependency_types, streaming,
+                                    text, cache, cache_dir,
+                                    profiler is not None))))
+                if len(pending) >= 2 * processes:
+                    yield collect(*pending.popleft())
+            while pending:
+                yield collect(*pending.popleft())
+        return
+    for xml_filename in xml_filenames:
+        stats = dict()
+        rows = {dependency_type: 0 for dependency_type in dependency_types}
+        start = time.perf_counter()
+        for results in extract_file(xml_filename, dependency_types,
+                                    streaming=streaming, processes=processes,
+                                    text=text, cache=cache,
+                                    cache_dir=cache_dir, stats=stats,
+                                    verbose=verbose):
+            for dependency_type, lines in results.items():
+                rows[dependency_type] += len(lines)
+            yield results
+        stats['seconds'] = time.perf_counter() - start
+        file_stats.append(file_summary(xml_filename, stats, rows))
+        if verbose:
+            print('INFO: File:', file_stats[-1])
+
+
+def file_summary(xml_filename: str, stats: dict, rows: dict) -> dict:
+    """
+    :param xml_filename: corpus file
+    :param stats: stats of the file, as filled in by extract_file (and the
+                  'seconds' spent on it)
+    :param rows: dict dependency type -> number of output lines
+    :return: stats dict of the file (see extract_files)
+    """
+    summary = {'file': xml_filename,
+               'sentences': stats['sentences'],
+               'rows': dict(rows),
+               'seconds': round(stats['seconds'], 3)}
+    for key in ('cache_hits', 'cache_misses', 'cache_removed'):
+        if key in stats:
+            summary[key] = stats[key]
+    return summary
+
+
+def main(streaming: bool = True, processes: int = 1, text: str = 'terminals',
+         profile: str = None, dependency_types: list = ('TOPIC-REL',),
+         cache: bool = False, cache_dir: str = None, xml_files: list = None,
+         output: str = None, stats: str = None):
+    """
+    Extract the FGD paths from the corpus files and write them to a csv file.
+    :param streaming: parse the corpus incrementally (iter_sentences) instead
+                      of loading the whole file at once (split_sentences)
+    :param processes: number of worker processes; with more than one, the
+                      corpus files (or the sentences of a single file) are
+                      parsed and analyzed in a process pool and the rows are
+                      written in file and corpus order, as in the serial run
+    :param text: how to get the sentence text ('terminals', 'c-structure' or
+                 'none' to leave the text column empty), see analyze_sentence
+    :param profile: file name for a json report of per-stage timing,
+                    failures by category and the slowest sentences (no
+                    profiling if not given)
+    :param dependency_types: dependency types to extract in the same pass
+                             over the corpus; with more than one, the rows of
+                             each type are written to their own file, named
+                             after the output file and the type (e.g.
+                             rc_example_rc.csv and rc_example_wh.csv)
+    :param cache: keep the rows and diagnostics of every sentence in an
+                  on-disk cache, and only analyze the sentences that are new
+                  or changed since the last run (see SentenceCache); with
+                  profiling, only the analyzed sentences are profiled
+    :param cache_dir: cache directory; defaults to .extraction_cache next to
+                      the corpus file
+    :param xml_files: corpus files or glob patterns, processed in the given
+                      order (default: examples/rc_example.xml); gzip, bz2 and
+                      xz compressed files are read as they are (see
+                      open_corpus)
+    :param output: output csv file (default: the first corpus file with the
+                   extension .csv)
+    :param stats: file name for a json report of the counts and time of
+                  every corpus file and their totals (not written if not
+                  given)
+    :return: output lines (dict dependency type -> output lines if there is
+             more than one dependency type)
+    """
+    verbose = verbose_default
+    # diagnostics of this run only
+    del failing_labels[:]
+    del worked_ids[:]
+    
+    if xml_files is None:
+        xml_files = [os.path.join(os.path.abspath('examples'),
+                                  'rc_example.xml')]
+    xml_filenames = expand_inputs(xml_files)
+    if output is None:
+        output = corpus_name(xml_filenames[0]) + '.csv'
+        
+    # initialize content to write to output files
+    outs = dict()
+    for dependency_type in dependency_types:
+        outs[dependency_type] = ['web_id,sent_id,graph_id,text,pro_position,'
+                                 'cleaned_path\n']
+    
+    if verbose:
+        print("INFO: Starting sentence analysis.")
+    
+    if profile:
+        enable_profiling()
+    try:
+        start = time.perf_counter()
+        file_stats = list()
+        for results in extract_files(xml_filenames, dependency_types,
+                                     streaming=streaming, processes=processes,
+                                     text=text, cache=cache,
+                                     cache_dir=cache_dir,
+                                     file_stats=file_stats, verbose=verbose):
+            for dependency_type, lines in results.items():
+                outs[dependency_type].extend(lines)
+        n_sentences = sum(file['sentences'] for file in file_stats)
+        n_rows = sum(len(out) - 1 for out in outs.values())
+        if profile:
+            report = profiler.report()
+    finally:  # never leave the stage functions instrumented
+        if profile:
+            disable_profiling()
+    if verbose:
+        print("INFO: Summary:", summarize_diagnostics(n_sentences, n_rows))
+    if profile:
+        report['diagnostics'] = summarize_diagnostics(n_sentences, n_rows)
+        report['files'] = file_stats
+        if cache:
+            report['cache'] = {key: sum(file['cache_' + key]
+                                        for file in file_stats)
+                               for key in ('hits', 'misses')}
+        with open(profile, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+    if stats:
+        totals = {'files': len(file_stats), 'sentences': n_sentences,
+                  'rows': {dependency_type: len(out) - 1
+                           for dependency_type, out in outs.items()},
+                  'seconds': round(time.perf_counter() - start, 3)}
+        with open(stats, 'w', encoding='utf-8') as f:
+            json.dump({'files': file_stats, 'total': totals}, f, indent=1)
+    for dependency_type, out in outs.items():
+        write_file(output_filename(output, dependency_type, len(outs)), out)
+    if len(outs) == 1:
+        out, = outs.values()
+        return out
+    return outs
+
+
+def cli(argv: list = None) -> None:
+    """
+    Command line entry point, see python find_f_labels.py --help.
+    :param argv: command line arguments (default: sys.argv[1:])
+    """
+    parser = argparse.ArgumentParser(
+        description='Extract the paths of filler-gap dependencies from '
+                    'tiger-xml corpus files.')
+    parser.add_argument('xml_files', nargs='*', metavar='XML',
+                        help='corpus files or glob patterns, plain or gzip, '
+                             'bz2 or xz compressed (default: '
+                             'examples/rc_example.xml)')
+    parser.add_argument('-o', '--output',
+                        help='output csv (default: the first corpus file '
+                             'with the extension .csv); with several '
+                             'dependency types, one file per type, e.g. '
+                             'out_rc.csv and out_wh.csv')
+    parser.add_argument('-d', '--dependency-types', nargs='+',
+                        default=['TOPIC-REL'], metavar='TYPE',
+                        help='dependency types to extract, e.g. TOPIC-REL '
+                             'FOCUS-INT (default: TOPIC-REL)')
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help='number of worker processes (one file per '
+                             'process with several corpus files)')
+    parser.add_argument('--text', default='terminals',
+                        choices=['terminals', 'c-structure', 'none'],
+                        help='how to get the sentence text')
+    parser.add_argument('--profile', metavar='JSON',
+                        help='write a profiling report')
+    parser.add_argument('--stats', metavar='JSON',
+                        help='write the counts and time of every corpus file')
+    parser.add_argument('--cache', action='store_true',
+                        help='only analyze new and changed sentences')
+    parser.add_argument('--cache-dir',
+                        help='cache directory (default: .extraction_cache '
+                             'next to each corpus file)')
+    args = parser.parse_args(argv)
+    try:
+        main(processes=args.processes, text=args.text, profile=args.profile,
+             dependency_types=args.dependency_types, cache=args.cache,
+             cache_dir=args.cache_dir, xml_files=args.xml_files or None,
+             output=args.output, stats=args.stats)
+    except OSError as error:  # missing or unreadable corpus or output file
+        message = error.strerror or str(error)
+        if error.filename is not None:
+            message += f': {error.filename}'
+        sys.exit(f'{parser.prog}: error: {message}')
+
 
 if __name__ == '__main__':
-    results = main()
-    # pass
-    
\ No newline at end of file
+    cli()
@@ -0,0 +1,344 @@
+"""
+Generate synthetic tiger-xml corpora shaped like nob-child: every sentence
+has a flat c-structure over its words and an LFG f-structure in which
+filler-gap dependencies (relative clauses under TOPIC-REL, or questions
+under FOCUS-INT) reach a 'pro' gap through a random path of container
+nodes. Alongside the xml, the paths the dependencies were built with are
+written in the csv format of find_f_labels, so the corpus comes with its
+own path corpus for the learner.
+
+f-levels are numbered from 1 on by default, in random order, so that ids of
+different widths (f_3, f_13, f_31) occur in the same sentence and a level
+may have a larger number than the levels it embeds, as in the real corpora;
+--first-level sets another start.
+
+Usage:
+    python synthetic_corpus.py synthetic.xml --sentences 10000 --seed 1
+"""
+import argparse
+import random
+from xml.sax.saxutils import quoteattr
+
+from find_f_labels import format_text
+
+
+HEADER = '''<?xml version="1.0" encoding="utf-8"?>
+<corpus id="nob-child-synthetic">
+<head><meta>
+<name>nob-child-synthetic</name>
+<author></author>
+<date></date></meta>
+<annotation>
+<feature name="word" domain="T"/>
+<feature name="cat" domain="NT"/>
+<feature name="val" domain="T"/>
+<feature name="edge" domain="FREC"/>
+<edgelabel><value name="--"/></edgelabel></annotation></head><body>
+'''
+FOOTER = '</body>\n</corpus>\n'
+
+NOUNS = ['gutten', 'jenta', 'huset', 'boka', 'mamma', 'pappa', 'katten',
+         'bilen', 'skolen', 'maten']
+VERBS = ['sa', 'trodde', 'så', 'visste', 'lurte', 'laget', 'fant', 'ville']
+
+# container nodes between the filler clause and the gap, with weights
+CONTAINERS = [('COMP', 30), ('XCOMP', 25), ('ADJUNCT', 25), ('OBJ', 10),
+              ('OBL-TH', 10)]
+GAPS = [('SUBJ', 50), ('OBJ', 35), ('OBL-TH', 10), ('PREDLINK', 5)]
+COMP_TYPES = [('nominal', 80), ('wh-int', 10), ('pol-int', 10)]
+# (no relative clauses inside a path: the extraction starts a path at the
+# closest relative clause above the gap)
+ADJUNCT_TYPES = [(None, 75), ('adv', 25)]
+
+
+def choose(rng, weighted):
+    """
+    :param rng: random.Random
+    :param weighted: list of (value, weight)
+    :return: one of the values
+    """
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+class SentenceBuilder:
+    """
+    Collect the terminals and non-terminals of one synthetic sentence.
+    """
+
+    def __init__(self, web_id, first_level=1):
+        """
+        :param web_id: number of the sentence (used in its ids)
+        :param first_level: number of the first f-level below TOP
+        """
+        self.prefix = f's{web_id}_0_'
+        self.words = []
+        self.features = []  # f-structure terminals (id, val)
+        self.f_nodes = {}  # f-level id -> list of (label, idref)
+        self.next_level = first_level
+
+    def level(self, top=False):
+        """
+        :param top: create the TOP level (f_0)
+        :return: id of a new f-level
+        """
+        if top:
+            f_id = self.prefix + 'f_0'
+        else:
+            f_id = self.prefix + f'f_{self.next_level}'
+            self.next_level += 1
+        self.f_nodes[f_id] = []
+        return f_id
+
+    def shuffle_levels(self, rng):
+        """
+        Renumber the f-levels below TOP in random order.
+        :param rng: random.Random
+        """
+        top = self.prefix + 'f_0'
+        levels = [f_id for f_id in self.f_nodes if f_id != top]
+        renamed = dict(zip(levels, rng.sample(levels, len(levels))))
+        renamed[top] = top
+
+        def rename(node_id):  # f-level, or terminal <level>_<feature>
+            if node_id in renamed:
+                return renamed[node_id]
+            level, feature = node_id.rsplit('_', 1)
+            return renamed[level] + '_' + feature
+
+        self.f_nodes = {renamed[f_id]: [(label, rename(idref))
+                                        for label, idref in edges]
+                        for f_id, edges in self.f_nodes.items()}
+        self.features = [(rename(t_id), val) for t_id, val in self.features]
+
+    def edge(self, parent, label, child):
+        self.f_nodes[parent].append((label, child))
+
+    def feature(self, level, name, val):
+        """
+        Add an atomic feature (a terminal) to an f-level.
+        """
+        t_id = f'{level}_{name}'
+        self.features.append((t_id, val))
+        self.edge(level, name, t_id)
+
+    def word(self, word):
+        self.words.append(word)
+
+    def root_id(self):
+        """
+        :return: id of the c-structure root (once all words are added)
+        """
+        return self.prefix + f'c_{len(self.words) + 1}'
+
+    def xml(self, sentence_id):
+        """
+        :param sentence_id: sentence id (s attribute)
+        :return: xml of the sentence (str)
+        """
+        word_ids = [self.prefix + f'c_{i + 1}' for i in range(len(self.words))]
+        root_id = self.root_id()
+        ip_id = self.prefix + f'c_{len(self.words) + 2}'
+        lines = [f'<s id="{sentence_id}">', f'<graph root="{root_id}">',
+                 '<terminals>']
+        for t_id, word in zip(word_ids, self.words):
+            lines.append(f'<t id="{t_id}" word={quoteattr(word)} val="--"/>')
+        for t_id, val in self.features:
+            lines.append(f'<t id="{t_id}" word="--" val={quoteattr(val)}/>')
+        lines.append('</terminals>')
+        lines.append('<nonterminals>')
+        top = self.prefix + 'f_0'
+        lines.append(f'<nt id="{root_id}" cat="ROOT">\n'
+                     f'   <edge label="f::" idref="{top}"/>\n'
+                     f'   <edge label="--" idref="{ip_id}"/></nt>')
+        lines.append(f'<nt id="{ip_id}" cat="IP">\n'
+                     f'   <edge label="f::" idref="{top}"/>\n'
+                     + '\n'.join(f'   <edge label="--" idref="{w_id}"/>'
+                                 for w_id in word_ids) + '</nt>')
+        for f_id, edges in self.f_nodes.items():
+            cat = '_TOP' if f_id == top else '--'
+            lines.append(f'<nt id="{f_id}" cat="{cat}">\n'
+                         + '\n'.join(f'   <edge label={quoteattr(label)} '
+                                     f'idref="{idref}"/>'
+                                     for label, idref in edges) + '</nt>')
+        lines.append('</nonterminals>')
+        lines.append('</graph>')
+        lines.append('</s>')
+        return '\n'.join(lines) + '\n'
+
+
+def noun(builder, rng):
+    """
+    :return: a new nominal f-level
+    """
+    level = builder.level()
+    word = rng.choice(NOUNS)
+    builder.word(word)
+    builder.feature(level, 'PRED', word)
+    return level
+
+
+def clause(builder, rng, clause_type=None):
+    """
+    :return: a new clausal f-level, with CLAUSE-TYPE if clause_type is given
+    """
+    level = builder.level()
+    builder.word(rng.choice(VERBS))
+    if clause_type is not None:
+        builder.feature(level, 'CLAUSE-TYPE', clause_type)
+    return level
+
+
+def dependency(builder, rng, filler_level, dependency_type, depth):
+    """
+    Build the f-structure from the level of the filler down to a 'pro' gap.
+    :param builder: SentenceBuilder
+    :param rng: random.Random
+    :param filler_level: f-level with the dependency_type edge
+    :param dependency_type: TOPIC-REL or FOCUS-INT
+    :param depth: number of container nodes between filler level and gap
+    :return: gap position, cleaned path (labels from filler to gap)
+    """
+    path = []
+    level = filler_level
+    for _ in range(depth):
+        label = choose(rng, CONTAINERS)
+        if label == 'COMP':
+            clause_type = choose(rng, COMP_TYPES)
+            child = clause(builder, rng, clause_type)
+            builder.edge(level, 'COMP', child)
+            path.append('COMP_' + clause_type)
+        elif label == 'ADJUNCT':
+            clause_type = choose(rng, ADJUNCT_TYPES)
+            adjunct_set = builder.level()
+            child = clause(builder, rng, clause_type)
+            builder.edge(level, 'ADJUNCT', adjunct_set)
+            builder.edge(adjunct_set, '$', child)
+            path.append('ADJUNCT' if clause_type is None
+                        else 'ADJUNCT_' + clause_type)
+        elif label == 'XCOMP':
+            child = clause(builder, rng)
+            builder.edge(level, 'XCOMP', child)
+            path.append('XCOMP')
+        else:
+            child = noun(builder, rng)
+            builder.edge(level, label, child)
+            path.append(label)
+        level = child
+    gap = choose(rng, GAPS)
+    pro = builder.level()
+    builder.feature(pro, 'PRED', 'pro')
+    builder.edge(filler_level, dependency_type, pro)
+    builder.edge(level, gap, pro)
+    path.append(gap)
+    return gap, ' '.join(path)
+
+
+def generate_sentence(rng, web_id, max_depth=3, max_dependencies=2,
+                      dependency_type='TOPIC-REL', first_level=1):
+    """
+    Generate one sentence.
+    :param rng: random.Random
+    :param web_id: number of the sentence (used in its ids)
+    :param max_depth: largest number of container nodes on a path
+    :param max_dependencies: largest number of dependencies per sentence
+    :param dependency_type: TOPIC-REL (relative clauses) or FOCUS-INT
+                            (a question; one dependency, at the top level)
+    :param first_level: number of the first f-level below TOP
+    :return: sentence xml, output rows of find_f_labels for the sentence
+             (csv lines)
+    """
+    builder = SentenceBuilder(web_id, first_level)
+    top = builder.level(top=True)
+    builder.word(rng.choice(VERBS).capitalize())
+    dependencies = []
+    if dependency_type == 'FOCUS-INT':
+        builder.feature(top, 'STMT-TYPE', 'int')
+        dependencies.append(dependency(builder, rng, top, dependency_type,
+                                       rng.randint(0, max_depth)))
+    else:
+        builder.feature(top, 'STMT-TYPE', 'decl')
+        builder.edge(top, 'SUBJ', noun(builder, rng))
+        hosts = builder.level()
+        builder.edge(top, 'ADJUNCT', hosts)
+        for _ in range(rng.randint(1, max_dependencies)):
+            # host noun modified by a relative clause: ADJUNCT $ rel-clause
+            host = noun(builder, rng)
+            builder.edge(hosts, '$', host)
+            relatives = builder.level()
+            builder.edge(host, 'ADJUNCT', relatives)
+            rel_clause = clause(builder, rng, 'rel')
+            builder.edge(relatives, '$', rel_clause)
+            dependencies.append(dependency(builder, rng, rel_clause,
+                                           dependency_type,
+                                           rng.randint(0, max_depth)))
+    builder.word('.')
+    builder.shuffle_levels(rng)
+    line = f'{web_id},s{web_id},{builder.root_id()},' \
+        f'{format_text(builder.words)},'
+    return builder.xml(f's{web_id}'), [line + f'{gap},{path}\n'
+                                        for gap, path in dependencies]
+
+
+def write_corpus(filename, num_sentences, paths_file=None, seed=None,
+                 max_depth=3, max_dependencies=2,
+                 dependency_type='TOPIC-REL', first_level=1):
+    """
+    Write a synthetic corpus, one sentence at a time.
+    :param filename: path of the xml file
+    :param num_sentences: number of sentences
+    :param paths_file: path of the csv with the built paths (optional)
+    :param seed: random seed
+    :param max_depth: largest number of container nodes on a path
+    :param max_dependencies: largest number of dependencies per sentence
+    :param dependency_type: TOPIC-REL or FOCUS-INT
+    :param first_level: number of the first f-level below TOP
+    :return: number of dependencies written
+    """
+    rng = random.Random(seed)
+    num_dependencies = 0
+    paths = open(paths_file, 'w', encoding='utf-8') if paths_file else None
+    try:
+        if paths is not None:
+            paths.write('web_id,sent_id,graph_id,text,pro_position,'
+                        'cleaned_path\n')
+        with open(filename, 'w', encoding='utf-8') as xml_file:
+            xml_file.write(HEADER)
+            for web_id in range(1, num_sentences + 1):
+                sentence, rows = generate_sentence(
+                    rng, web_id, max_depth, max_dependencies, dependency_type,
+                    first_level)
+                xml_file.write(sentence)
+                num_dependencies += len(rows)
+                if paths is not None:
+                    paths.writelines(rows)
+            xml_file.write(FOOTER)
+    finally:
+        if paths is not None:
+            paths.close()
+    return num_dependencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('xml_file', help='output tiger-xml file')
+    parser.add_argument('--paths', help='output csv with the built paths')
+    parser.add_argument('--sentences', type=int, default=1000)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--max-depth', type=int, default=3,
+                        help='largest number of container nodes on a path')
+    parser.add_argument('--max-dependencies', type=int, default=2,
+                        help='largest number of dependencies per sentence')
+    parser.add_argument('--dependency-type', default='TOPIC-REL',
+                        choices=['TOPIC-REL', 'FOCUS-INT'])
+    parser.add_argument('--first-level', type=int, default=1,
+                        help='number of the first f-level below TOP')
+    args = parser.parse_args()
+    count = write_corpus(args.xml_file, args.sentences, args.paths, args.seed,
+                         args.max_depth, args.max_dependencies,
+                         args.dependency_type, args.first_level)
+    print(f'{args.sentences} sentences, {count} dependencies')
+
+
+if __name__ == '__main__':
+    main()
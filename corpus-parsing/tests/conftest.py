@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the extraction modules are scripts next to this directory, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
@@ -0,0 +1,173 @@
+"""
+The extraction modes against each other and against the paths the
+synthetic corpus was built with: serial (streaming or not), parallel,
+cached and sharded (compressed shards, one per process) runs have to
+write the same rows in the same order.
+"""
+import bz2
+import gzip
+import json
+import lzma
+import os
+import shutil
+
+import pytest
+
+import find_f_labels
+from synthetic_corpus import write_corpus
+
+DEPENDENCY_TYPES = ['TOPIC-REL', 'FOCUS-INT']
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                       'examples', 'rc_example.xml')
+
+
+@pytest.fixture(scope='module')
+def shards(tmp_path_factory):
+    """
+    :return: three corpus files (relative clauses and questions), and the
+             gold rows of each dependency type
+    """
+    directory = tmp_path_factory.mktemp('corpus')
+    filenames = list()
+    gold = {dependency_type: list() for dependency_type in DEPENDENCY_TYPES}
+    for k, dependency_type in enumerate(['TOPIC-REL', 'FOCUS-INT',
+                                         'TOPIC-REL']):
+        filename = str(directory / f'shard_{k}.xml')
+        paths_file = str(directory / f'shard_{k}.csv')
+        write_corpus(filename, 250, paths_file, seed=k, max_depth=4,
+                     max_dependencies=3, dependency_type=dependency_type)
+        with open(paths_file, encoding='utf-8') as f:
+            gold[dependency_type].extend(f.readlines()[1:])
+        filenames.append(filename)
+    return filenames, gold
+
+
+def extract(filenames, output, **kwargs):
+    """
+    :return: rows per dependency type (without the header)
+    """
+    outs = find_f_labels.main(xml_files=filenames, output=str(output),
+                              dependency_types=DEPENDENCY_TYPES, **kwargs)
+    return {dependency_type: lines[1:]
+            for dependency_type, lines in outs.items()}
+
+
+@pytest.fixture(scope='module')
+def serial(shards, tmp_path_factory):
+    filenames, _ = shards
+    return extract(filenames, tmp_path_factory.mktemp('serial') / 'out.csv')
+
+
+def test_serial_matches_gold(shards, serial):
+    _, gold = shards
+    assert serial == gold
+
+
+def test_split_sentences_matches_streaming(shards, serial, tmp_path):
+    filenames, _ = shards
+    assert extract(filenames, tmp_path / 'out.csv', streaming=False) == serial
+
+
+def test_parallel_matches_serial(shards, serial, tmp_path):
+    filenames, _ = shards
+    # one file at a time, in chunks of sentences
+    rows = {dependency_type: list() for dependency_type in DEPENDENCY_TYPES}
+    for k, filename in enumerate(filenames):
+        for dependency_type, lines in extract(
+                [filename], tmp_path / f'out_{k}.csv', processes=2).items():
+            rows[dependency_type].extend(lines)
+    assert rows == serial
+
+
+def test_cached_matches_serial(shards, serial, tmp_path):
+    filenames, _ = shards
+    cache_dir = str(tmp_path / 'cache')
+    stats_file = str(tmp_path / 'stats.json')
+    num_sentences = 3 * 250
+    for processes, hits in ((1, 0), (2, num_sentences)):
+        assert extract(filenames, tmp_path / 'out.csv', cache=True,
+                       cache_dir=cache_dir, processes=processes,
+                       stats=stats_file) == serial
+        with open(stats_file, encoding='utf-8') as f:
+            files = json.load(f)['files']
+        assert sum(file['cache_hits'] for file in files) == hits
+        assert sum(file['cache_misses'] for file in files) == \
+            num_sentences - hits
+
+
+def test_compressed_shards_match_serial(shards, serial, tmp_path):
+    filenames, _ = shards
+    compressed = list()
+    for filename, open_compressed, extension in zip(
+            filenames, [gzip.open, bz2.open, lzma.open],
+            ['.gz', '.bz2', '.xz']):
+        target = str(tmp_path / (os.path.basename(filename) + extension))
+        with open(filename, 'rb') as source, \
+                open_compressed(target, 'wb') as f:
+            shutil.copyfileobj(source, f)
+        compressed.append(target)
+    stats_file = str(tmp_path / 'stats.json')
+    for processes in (1, 2):
+        assert extract(compressed, tmp_path / 'out.csv', processes=processes,
+                       stats=stats_file) == serial
+        with open(stats_file, encoding='utf-8') as f:
+            stats = json.load(f)
+        assert [file['file'] for file in stats['files']] == compressed
+        assert [file['sentences'] for file in stats['files']] == [250] * 3
+        assert stats['total']['rows'] == {
+            dependency_type: len(lines)
+            for dependency_type, lines in serial.items()}
+
+
+def test_diagnostics_are_per_run(tmp_path):
+    for run in range(2):
+        profile = str(tmp_path / f'profile_{run}.json')
+        find_f_labels.main(xml_files=[EXAMPLE],
+                           output=str(tmp_path / 'out.csv'), profile=profile)
+        assert len(find_f_labels.worked_ids) == 3
+        with open(profile, encoding='utf-8') as f:
+            assert json.load(f)['diagnostics']['worked'] == 3
+
+
+def test_cli_reports_missing_file(tmp_path):
+    missing = str(tmp_path / 'missing.xml')
+    with pytest.raises(SystemExit) as exit_info:
+        find_f_labels.cli([missing, '-o', str(tmp_path / 'out.csv')])
+    # (the program name is the one of the test runner here)
+    assert exit_info.value.code.endswith(
+        f': error: No such file or directory: {missing}')
+
+
+def profiled_functions():
+    return {name: getattr(find_f_labels, name)
+            for name in find_f_labels.PROFILED_STAGES
+            + ['analyze_dependencies']}
+
+
+def test_profiler_counts_stage_calls(tmp_path):
+    originals = profiled_functions()
+    profile = str(tmp_path / 'profile.json')
+    find_f_labels.main(xml_files=[EXAMPLE], output=str(tmp_path / 'out.csv'),
+                       profile=profile)
+    with open(profile, encoding='utf-8') as f:
+        report = json.load(f)
+    # rc_example.xml has three sentences with one relative clause each;
+    # create_graph is only used for text='c-structure'
+    assert report['sentences'] == 3
+    assert {stage: report['stages'][stage]['calls']
+            for stage in find_f_labels.PROFILED_STAGES} == {
+        'create_graph': 0, 'find_pred': 3, 'find_edges': 3,
+        'find_syntactic_position': 3, 'find_embedding_level_recursive': 3,
+        'truncate_path': 3, 'clean_path': 3}
+    assert profiled_functions() == originals
+    assert find_f_labels.profiler is None
+
+
+def test_profiler_is_disabled_after_a_failure(tmp_path):
+    originals = profiled_functions()
+    with pytest.raises(FileNotFoundError):
+        find_f_labels.main(xml_files=[EXAMPLE, str(tmp_path / 'missing.xml')],
+                           output=str(tmp_path / 'out.csv'),
+                           profile=str(tmp_path / 'profile.json'))
+    assert profiled_functions() == originals
+    assert find_f_labels.profiler is None
@@ -0,0 +1,43 @@
+"""
+f-levels are matched by their full id: real corpora mix id widths (f_2,
+f_14, f_38), so a level number must not match as a suffix or substring of
+another one.
+"""
+import find_f_labels
+
+
+def index(*edges):
+    """
+    :param edges: (parent id, label, idref) triples
+    :return: f-structure index with the edges, as build_f_index's
+    """
+    f_index = {'parents': dict(), 'edges': dict(), 'clauses': dict()}
+    for parent, label, idref in edges:
+        f_index['parents'].setdefault(idref, []).append((parent, label))
+        f_index['edges'].setdefault(label, []).append((parent, idref))
+    return f_index
+
+
+def test_find_edges_does_not_match_longer_level():
+    # pro on f_5; the TOPIC-REL edge points to f_15
+    f_index = index(('s1_0_f_3', 'TOPIC-REL', 's1_0_f_15'))
+    edges, truncation_points = find_f_labels.find_edges(
+        None, ['5'], ['pro'], f_index=f_index)
+    assert edges == {} and truncation_points == []
+    edges, truncation_points = find_f_labels.find_edges(
+        None, ['15'], ['pro'], f_index=f_index)
+    assert edges == {'s1_0_f_15': 'pro'}
+    assert truncation_points == ['s1_0_f_3']
+
+
+def test_truncate_path_does_not_match_longer_level():
+    path = [('s1_0_f_12', 'OBJ', None), ('s1_0_f_4', 'COMP', 'nominal'),
+            ('s1_0_f_1', 'ADJUNCT', None), ('s1_0_f_2', '$', 'decl')]
+    # f_1 is not f_12: the path is cut at f_1, not before f_12
+    assert find_f_labels.truncate_path('s1_0_f_1', path) == path[:2]
+
+
+def test_truncate_path_f_10_is_not_top():
+    path = [('s1_0_f_12', 'OBJ', None), ('s1_0_f_4', 'COMP', 'nominal')]
+    assert find_f_labels.truncate_path('s1_0_f_0', path) == path
+    assert find_f_labels.truncate_path('s1_0_f_10', path) == []
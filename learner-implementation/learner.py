@@ -0,0 +1,129 @@
+"""
+Command line entry points of the learner: train n-gram models on a path
+table and save them as a model file, and score paths with a model file
+(or a model trained on the fly).
+
+The learner modules (numpy, and pandas for spreadsheets) are only imported
+by the command that runs, so that short invocations start quickly.
+
+Usage:
+    python learner.py train output_rc_corrected_oct23.xlsx --n-gram 2 3 \\
+        -o rc.ngm
+    python learner.py score --model rc.ngm --n-gram 2 "COMP_nominal OBJ"
+    python learner.py score --model rc.ngm --n-gram 2 -i paths.txt -o out.csv
+"""
+import argparse
+import csv
+import sys
+
+
+def train(args):
+    """
+    Train models of the requested orders and write them to one model file.
+    """
+    from learner_functions import load_paths, save_models
+    corpus = load_paths(args.paths, args.column)
+    models = [corpus.ngram_model(n_gram, args.alpha) for n_gram in args.n_gram]
+    save_models(args.output, models)
+    print(f'{len(corpus)} paths, '
+          + ', '.join(f'{model.n_gram}-grams: {model.types} types'
+                      for model in models)
+          + f' -> {args.output}', file=sys.stderr)
+
+
+def read_paths(args):
+    """
+    :return: paths to score, from the command line, or one per line from
+             the input file (stdin for -)
+    """
+    if args.input is None:
+        return list(args.path)
+    infile = sys.stdin if args.input == '-' else \
+        open(args.input, encoding='utf-8')
+    try:
+        return list(args.path) + [line.strip() for line in infile
+                                  if line.strip()]
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+
+def score(args):
+    """
+    Score paths and write path, log probability and unattested n-grams as
+    csv.
+    """
+    from learner_functions import NgramModel, load_paths
+    if args.model:
+        try:
+            model = NgramModel.load(args.model, args.n_gram)
+        except (KeyError, ValueError) as error:
+            sys.exit(str(error).strip("'"))
+    else:
+        if args.n_gram is None:
+            sys.exit('--n-gram is required with --paths')
+        model = load_paths(args.paths, args.column).ngram_model(args.n_gram,
+                                                                args.alpha)
+    paths = read_paths(args)
+    log_probs, unattested = model.score(paths)
+    outfile = sys.stdout if args.output in (None, '-') else \
+        open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        writer = csv.writer(outfile, lineterminator='\n')
+        writer.writerow(['path', 'log_probability', 'unattested_ngrams'])
+        for path, log_prob, ngrams in zip(paths, log_probs.tolist(),
+                                          unattested):
+            writer.writerow(['start ' + path + ' end', log_prob, str(ngrams)])
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_train = commands.add_parser('train', help='train and save models')
+    parser_train.add_argument('paths', help='path table (xlsx or csv)')
+    parser_train.add_argument('--n-gram', type=int, nargs='+', default=[2, 3],
+                              help='n-gram orders (default: 2 3)')
+    parser_train.add_argument('--alpha', type=float, default=0.5,
+                              help='smoothing parameter')
+    parser_train.add_argument('--column',
+                              help='path column (default: Chosen_path for '
+                                   'spreadsheets, cleaned_path for csv)')
+    parser_train.add_argument('-o', '--output', required=True,
+                              help='model file')
+    parser_train.set_defaults(func=train)
+
+    parser_score = commands.add_parser('score', help='score paths')
+    source = parser_score.add_mutually_exclusive_group(required=True)
+    source.add_argument('--model', help='model file written by train')
+    source.add_argument('--paths', help='path table (xlsx or csv) to train on')
+    parser_score.add_argument('--n-gram', type=int,
+                              help='n-gram order (optional for single-order '
+                                   'model files)')
+    parser_score.add_argument('--alpha', type=float, default=0.5,
+                              help='smoothing parameter when training from '
+                                   '--paths')
+    parser_score.add_argument('--column', help='path column of --paths')
+    parser_score.add_argument('path', nargs='*',
+                              help='paths to score, e.g. "COMP_nominal OBJ"')
+    parser_score.add_argument('-i', '--input',
+                              help='file with one path per line (- for stdin)')
+    parser_score.add_argument('-o', '--output', help='output csv (stdout by '
+                                                     'default)')
+    parser_score.set_defaults(func=score)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except OSError as error:  # missing or unreadable model, table or input
+        message = error.strerror or str(error)
+        if error.filename is not None:
+            message += f': {error.filename}'
+        sys.exit(f'{parser.prog}: error: {message}')
+
+
+if __name__ == "__main__":
+    main()
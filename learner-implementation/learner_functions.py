@@ -1,7 +1,8 @@
+import hashlib
+import json
 import math
+import os
 import numpy as np
-from nltk.util import ngrams
-from nltk.probability import FreqDist
 
 
 def get_ngrams(seq_arr, n_gram):
@@ -11,9 +12,9 @@ def get_ngrams(seq_arr, n_gram):
     :param n_gram: n-gram window size as int
     :return: n-grams of container nodes (list of lists)
     """
-    seq_arr.insert(0, 'start')
-    seq_arr.append('end')
-    n_grams = list(ngrams(seq_arr, n_gram))
+    seq_arr = ['start'] + list(seq_arr) + ['end']  # input list is not modified
+    # sliding windows, as nltk.util.ngrams (without importing nltk)
+    n_grams = list(zip(*(seq_arr[i:] for i in range(n_gram))))
     return n_grams
 
 
@@ -23,6 +24,7 @@ def get_freq_dist(all_ngrams_list):
     param all_ngrams_list: list of all n-grams (list of lists)
     :return: FreqDist object
     """
+    from nltk.probability import FreqDist
     freq_dist = FreqDist(ngr for ngr in all_ngrams_list)
     # print(freq_dist.max())  # the most frequent n-grams
     # print(freq_dist.hapaxes())  # n-grams that occur only once
@@ -35,19 +37,22 @@ def get_prob(node_seq, freq_dist, n_gram):
     :param node_seq: container node sequence as list
     :param freq_dist: FreqDist object as returned by get_freq_dist
     :param n_gram: n_gram window size as int
-    :return: log prob as int, node_seq, list of unattested n-grams
+    :return: log prob as int, node_seq (with start and end nodes), list of
+             unattested n-grams, raw prob
     """
     alpha = 0.5  # for unattested ngrams
     ngrams = get_ngrams(node_seq, n_gram)
+    node_seq = ['start'] + list(node_seq) + ['end']
     unattested = []
     # print(ngrams)
     probs = []
+    norm = freq_dist.N() + len(freq_dist)*alpha
     for ngr in ngrams:
         if ngr in freq_dist:
             freq = freq_dist[ngr] + alpha
-            ngr_prob = freq/(freq_dist.N() + len(freq_dist)*alpha)
+            ngr_prob = freq/norm
         else:
-            ngr_prob = alpha/(freq_dist.N() + len(freq_dist)*alpha)
+            ngr_prob = alpha/norm
             unattested.append(ngr)
         probs.append(ngr_prob)
     result = math.log(np.prod(probs))
@@ -56,25 +61,1596 @@ def get_prob(node_seq, freq_dist, n_gram):
     return result, node_seq, unattested, result_raw
 
 
+class NgramModel:
+    """
+    Compiled n-gram model for scoring many container node paths at once.
+    Labels are interned to integer ids, and an n-gram is encoded as one
+    integer (its label ids as digits in base len(labels)). Counts are kept
+    in numpy arrays: a dense label x label matrix for bigrams, sorted n-gram
+    codes with their counts for higher orders. Scoring uses the same additive
+    smoothing as get_prob, in log space.
+    """
+
+    def __init__(self, labels, n_gram, codes, counts, alpha=0.5):
+        """
+        :param labels: label vocabulary (list of str), including start and end
+        :param n_gram: n-gram window size as int
+        :param codes: encoded n-grams (sorted int array)
+        :param counts: n-gram counts (int array aligned with codes)
+        :param alpha: additive smoothing parameter
+        """
+        if len(labels) ** n_gram >= 2 ** 63:
+            raise ValueError(f'{len(labels)} labels are too many to encode '
+                             f'{n_gram}-grams as int64')
+        self.labels = list(labels)
+        self.label_ids = {label: i for i, label in enumerate(self.labels)}
+        self.n_gram = n_gram
+        self.alpha = alpha
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.total = int(self.counts.sum())  # as freq_dist.N()
+        self.types = len(self.codes)  # as len(freq_dist)
+        self.log_norm = math.log(self.total + self.types * alpha)
+        self.dense = None
+        if n_gram == 2:
+            size = len(self.labels)
+            self.dense = np.zeros(size * size, dtype=np.int64)
+            self.dense[self.codes] = self.counts
+            self.dense = self.dense.reshape(size, size)
+
+    @classmethod
+    def from_paths(cls, paths, n_gram, alpha=0.5):
+        """
+        Count the n-grams of a corpus of paths.
+        :param paths: container node sequences (lists of labels or
+                      space-separated strings)
+        :param n_gram: n-gram window size as int
+        :param alpha: additive smoothing parameter
+        :return: NgramModel
+        """
+        labels = ['start', 'end']
+        label_ids = {'start': 0, 'end': 1}
+        for path in paths:
+            for label in split_path(path):
+                if label not in label_ids:
+                    label_ids[label] = len(labels)
+                    labels.append(label)
+        ids, offsets = encode_paths(paths, label_ids)
+        codes, _, _ = window_codes(ids, offsets, n_gram, len(labels))
+        codes, counts = np.unique(codes, return_counts=True)
+        return cls(labels, n_gram, codes, counts, alpha)
+
+    @classmethod
+    def from_freq_dist(cls, freq_dist, n_gram, alpha=0.5):
+        """
+        Compile a FreqDist as returned by get_freq_dist.
+        :param freq_dist: FreqDist object (or any dict) with n-gram tuples as
+                          keys and their counts as values
+        :param n_gram: n-gram window size as int
+        :param alpha: additive smoothing parameter
+        :return: NgramModel
+        """
+        labels = ['start', 'end']
+        label_ids = {'start': 0, 'end': 1}
+        for ngr in freq_dist:
+            for label in ngr:
+                if label not in label_ids:
+                    label_ids[label] = len(labels)
+                    labels.append(label)
+        size = len(labels)
+        codes = np.array([sum(label_ids[label] * size ** (n_gram - 1 - i)
+                              for i, label in enumerate(ngr))
+                          for ngr in freq_dist], dtype=np.int64)
+        counts = np.array([freq_dist[ngr] for ngr in freq_dist],
+                          dtype=np.int64)
+        order = np.argsort(codes)
+        return cls(labels, n_gram, codes[order], counts[order], alpha)
+
+    def find(self, codes):
+        """
+        Find encoded n-grams among the attested ones.
+        :param codes: encoded n-grams (int array, -1 for n-grams with a label
+                      outside the vocabulary)
+        :return: positions in self.codes (int array, -1 for unattested
+                 n-grams)
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if not self.types:
+            return np.full(len(codes), -1, dtype=np.int64)
+        pos = np.searchsorted(self.codes, codes)
+        pos[pos == self.types] = 0
+        return np.where((codes >= 0) & (self.codes[pos] == codes), pos, -1)
+
+    def lookup(self, codes):
+        """
+        Look up the counts of encoded n-grams.
+        :param codes: encoded n-grams (int array, -1 for n-grams with a label
+                      outside the vocabulary)
+        :return: counts (int array, 0 for unattested n-grams)
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if self.dense is not None:
+            valid = codes >= 0
+            return np.where(valid, self.dense.ravel()[np.where(valid, codes, 0)],
+                            0)
+        pos = self.find(codes)
+        return np.where(pos >= 0, self.counts[pos], 0)
+
+    def score(self, paths):
+        """
+        Score a batch of paths (without start and end nodes) in one go.
+        :param paths: container node sequences (lists of labels or
+                      space-separated strings)
+        :return: log probs (float array), list of unattested n-grams per path
+        """
+        paths = [split_path(path) for path in paths]
+        ids, offsets = encode_paths(paths, self.label_ids)
+        codes, starts, path_idx = window_codes(ids, offsets, self.n_gram,
+                                               len(self.labels))
+        counts = self.lookup(codes)
+        log_probs = np.bincount(path_idx,
+                                weights=np.log(counts + self.alpha)
+                                - self.log_norm,
+                                minlength=len(paths))
+        unattested = [[] for _ in paths]
+        if (counts == 0).any():
+            padded = [['start'] + path + ['end'] for path in paths]
+            for idx, start in zip(path_idx[counts == 0],
+                                  starts[counts == 0]):
+                start -= offsets[idx]
+                unattested[idx].append(
+                    tuple(padded[idx][start:start + self.n_gram]))
+        return log_probs, unattested
+
+    def score_ngrams(self, paths):
+        """
+        Score a batch of paths and break the scores down by n-gram.
+        :param paths: container node sequences (lists of labels or
+                      space-separated strings)
+        :return: log probs (float array), list per path of (n-gram tuple,
+                 log prob, count) triples in path order
+        """
+        paths = [split_path(path) for path in paths]
+        ids, offsets = encode_paths(paths, self.label_ids)
+        codes, starts, path_idx = window_codes(ids, offsets, self.n_gram,
+                                               len(self.labels))
+        counts = self.lookup(codes)
+        contributions = np.log(counts + self.alpha) - self.log_norm
+        log_probs = np.bincount(path_idx, weights=contributions,
+                                minlength=len(paths))
+        ngrams_per_path = [[] for _ in paths]
+        padded = [['start'] + path + ['end'] for path in paths]
+        for idx, start, contribution, count in zip(
+                path_idx.tolist(), (starts - offsets[path_idx]).tolist(),
+                contributions.tolist(), counts.tolist()):
+            ngrams_per_path[idx].append(
+                (tuple(padded[idx][start:start + self.n_gram]), contribution,
+                 count))
+        return log_probs, ngrams_per_path
+
+    def save(self, filename):
+        """
+        Write the model to a model file (see save_models).
+        :param filename: path of the model file
+        """
+        save_models(filename, [self])
+
+    @classmethod
+    def load(cls, filename, n_gram=None):
+        """
+        Load a model from a model file, memory-mapped (see load_models).
+        :param filename: path of the model file
+        :param n_gram: n-gram order to load; may be omitted if the file
+                       holds a single order
+        :return: NgramModel
+        """
+        models = load_models(filename)
+        if n_gram is None:
+            if len(models) != 1:
+                raise ValueError(f'{filename} holds the n-gram orders '
+                                 f'{sorted(models)}, choose one')
+            n_gram, = models
+        if n_gram not in models:
+            raise KeyError(f'{filename} has no {n_gram}-gram model')
+        return models[n_gram]
+
+
+MODEL_MAGIC = b'NGRMODL1'
+
+
+def save_models(filename, models):
+    """
+    Write trained models of one or several n-gram orders to a single file.
+    The file starts with MODEL_MAGIC, the length of a JSON header (uint64,
+    little endian) and the header itself: label vocabulary, and per order
+    the smoothing parameter, totals and the location of its arrays. The
+    sorted n-gram codes and counts follow as raw little-endian int64 arrays,
+    8-byte aligned, so that load_models can memory-map them.
+    :param filename: path of the model file
+    :param models: NgramModel objects with the same label vocabulary and
+                   different n-gram orders
+    """
+    models = list(models)
+    if not models:
+        raise ValueError('no models to save')
+    labels = models[0].labels
+    orders = {}
+    arrays = []
+    position = 0
+    for model in models:
+        if model.labels != labels:
+            raise ValueError('models in one file must share their labels')
+        if str(model.n_gram) in orders:
+            raise ValueError(f'two {model.n_gram}-gram models given')
+        orders[str(model.n_gram)] = {'alpha': model.alpha,
+                                     'total': model.total,
+                                     'types': model.types,
+                                     'codes': position,
+                                     'counts': position + 8 * model.types}
+        position += 16 * model.types
+        arrays += [model.codes, model.counts]
+    header = json.dumps({'labels': labels, 'orders': orders}).encode('utf-8')
+    header += b' ' * (-(len(MODEL_MAGIC) + 8 + len(header)) % 8)
+    with open(filename, 'wb') as f:
+        f.write(MODEL_MAGIC)
+        f.write(np.uint64(len(header)).astype('<u8').tobytes())
+        f.write(header)
+        for array in arrays:
+            f.write(np.ascontiguousarray(array, dtype='<i8').tobytes())
+
+
+def load_models(filename):
+    """
+    Load the models written by save_models. The count arrays are memory-mapped
+    read-only, so loading is fast and processes loading the same file share
+    its pages instead of holding copies.
+    :param filename: path of the model file
+    :return: dict n-gram order -> NgramModel
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+            raise ValueError(f'{filename} is not an n-gram model file')
+        header_size = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        header = json.loads(f.read(header_size).decode('utf-8'))
+    data_start = len(MODEL_MAGIC) + 8 + header_size
+    data = np.memmap(filename, dtype='<i8', mode='r', offset=data_start) \
+        if data_start < os.path.getsize(filename) else np.zeros(0, '<i8')
+    models = {}
+    for n_gram, order in header['orders'].items():
+        codes = data[order['codes'] // 8:order['codes'] // 8 + order['types']]
+        counts = data[order['counts'] // 8:
+                      order['counts'] // 8 + order['types']]
+        model = NgramModel(header['labels'], int(n_gram), codes, counts,
+                           order['alpha'])
+        if (model.total, model.types) != (order['total'], order['types']):
+            raise ValueError(f'{filename} is corrupt')
+        models[int(n_gram)] = model
+    return models
+
+
+class IncrementalNgramModel:
+    """
+    N-gram model that is trained incrementally: paths can be added and
+    removed, and the normalizer N + T * alpha of get_prob (N n-gram tokens,
+    T attested n-gram types) is kept up to date with O(1) work per n-gram.
+    Scores are the same as get_prob on a FreqDist of the current paths.
+    """
+
+    def __init__(self, n_gram, alpha=0.5):
+        """
+        :param n_gram: n-gram window size as int
+        :param alpha: additive smoothing parameter
+        """
+        self.n_gram = n_gram
+        self.alpha = alpha
+        self.counts = dict()  # n-gram tuple -> count, attested n-grams only
+        self.total = 0  # as freq_dist.N()
+        self.num_paths = 0
+
+    @property
+    def types(self):
+        return len(self.counts)  # as len(freq_dist)
+
+    def add_paths(self, paths):
+        """
+        Add paths to the training data.
+        :param paths: container node sequences (lists of labels or
+                      space-separated strings)
+        """
+        counts = self.counts
+        for path in paths:
+            for ngr in get_ngrams(split_path(path), self.n_gram):
+                counts[ngr] = counts.get(ngr, 0) + 1
+                self.total += 1
+            self.num_paths += 1
+
+    def remove_paths(self, paths):
+        """
+        Remove paths from the training data.
+        :param paths: container node sequences (lists of labels or
+                      space-separated strings)
+        :raises ValueError: if some n-gram of the paths is not in the model
+                            as often as in the paths (the model is then left
+                            unchanged)
+        """
+        paths = [split_path(path) for path in paths]
+        removed = dict()
+        for path in paths:
+            for ngr in get_ngrams(path, self.n_gram):
+                removed[ngr] = removed.get(ngr, 0) + 1
+        for ngr, count in removed.items():
+            if self.counts.get(ngr, 0) < count:
+                raise ValueError(f'cannot remove {ngr} {count} times, it has '
+                                 f'count {self.counts.get(ngr, 0)}')
+        for ngr, count in removed.items():
+            self.counts[ngr] -= count
+            if not self.counts[ngr]:
+                del self.counts[ngr]
+            self.total -= count
+        self.num_paths -= len(paths)
+
+    def score(self, paths):
+        """
+        Score paths (without start and end nodes) under the current counts.
+        :param paths: container node sequences (lists of labels or
+                      space-separated strings)
+        :return: log probs (float array), list of unattested n-grams per path
+        """
+        log_norm = math.log(self.total + self.types * self.alpha)
+        log_probs = []
+        unattested = []
+        for path in paths:
+            path_ngrams = get_ngrams(split_path(path), self.n_gram)
+            counts = [self.counts.get(ngr, 0) for ngr in path_ngrams]
+            log_probs.append(sum(math.log(count + self.alpha)
+                                 for count in counts)
+                             - len(counts) * log_norm)
+            unattested.append([ngr for ngr, count in zip(path_ngrams, counts)
+                               if not count])
+        return np.array(log_probs), unattested
+
+    def compile(self):
+        """
+        :return: the current counts as NgramModel, for batch scoring
+        """
+        return NgramModel.from_freq_dist(self.counts, self.n_gram, self.alpha)
+
+
+def staged_scores(batches, test_paths, n_gram, alpha=0.5):
+    """
+    Simulate a learning trajectory: add the training paths batch by batch
+    (e.g. child-directed paths binned by age) and score the test paths after
+    each batch. Each checkpoint costs only its own batch plus the test paths.
+    :param batches: iterable of lists of paths, in the order of learning
+    :param test_paths: paths to score (without start and end nodes)
+    :param n_gram: n-gram window size as int
+    :param alpha: additive smoothing parameter
+    :return: generator of (number of paths seen, log probs of the test paths,
+             unattested n-grams of the test paths) per checkpoint
+    """
+    model = IncrementalNgramModel(n_gram, alpha)
+    test_paths = [split_path(path) for path in test_paths]
+    for batch in batches:
+        model.add_paths(batch)
+        log_probs, unattested = model.score(test_paths)
+        yield model.num_paths, log_probs, unattested
+
+
+class PathCorpus:
+    """
+    Container node paths of a corpus, tokenized and interned once. The label
+    vocabulary starts with start and end like an NgramModel built with
+    from_paths, and ids/offsets are laid out as returned by encode_paths, so
+    n-grams can be counted straight from them.
+    """
+
+    def __init__(self, data, labels, ids, offsets):
+        """
+        :param data: the source table (pandas DataFrame)
+        :param labels: label vocabulary (list of str), starting with start, end
+        :param ids: flat label id array of the padded paths
+        :param offsets: offsets of the paths in ids (len(data) + 1)
+        """
+        self.data = data
+        self.labels = list(labels)
+        self.label_ids = {label: i for i, label in enumerate(self.labels)}
+        self.ids = ids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def path(self, i):
+        """
+        :param i: row number
+        :return: the path of row i as list of labels (without start and end)
+        """
+        return [self.labels[k]
+                for k in self.ids[self.offsets[i] + 1:self.offsets[i + 1] - 1]]
+
+    def paths(self):
+        """
+        :return: all paths as lists of labels (without start and end)
+        """
+        return [self.path(i) for i in range(len(self))]
+
+    def ngram_model(self, n_gram, alpha=0.5):
+        """
+        Count the n-grams of the corpus, as NgramModel.from_paths would.
+        :param n_gram: n-gram window size as int
+        :param alpha: additive smoothing parameter
+        :return: NgramModel
+        """
+        codes, _, _ = window_codes(self.ids, self.offsets, n_gram,
+                                   len(self.labels))
+        codes, counts = np.unique(codes, return_counts=True)
+        return NgramModel(self.labels, n_gram, codes, counts, alpha)
+
+
+def file_signature(filename, digest=False):
+    """
+    :param filename: path of a file
+    :param digest: also compute the sha256 of its contents
+    :return: dict with the mtime (ns) and size of the file, and its sha256
+    """
+    stat = os.stat(filename)
+    signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    if digest:
+        sha = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        signature['sha256'] = sha.hexdigest()
+    return signature
+
+
+def save_archive(filename, **arrays):
+    """
+    Write a numpy archive (np.savez) atomically: to a temporary file next to
+    it, which then replaces it, so that an interrupted write never leaves a
+    truncated archive behind and open readers of the old one are not
+    disturbed.
+    :param filename: path of the archive
+    :param arrays: arrays to store, by name
+    """
+    tmp_file = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_file, filename)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def load_paths(filename, path_column=None, cache_dir=None):
+    """
+    Load a path table (a corrected spreadsheet such as
+    output_rc_corrected_oct23.xlsx, or a csv written by find_f_labels) as a
+    PathCorpus. The first load converts the table into a cache: the table as
+    parquet, and the tokenized, interned paths as a numpy archive. Later
+    loads read the cache as long as the source file is unchanged: same mtime
+    and size, or else the same sha256 (e.g. after a copy or checkout).
+    Paths are split as in the notebooks (str(path).split()), so a blank cell
+    is read as the path ['nan'].
+    :param filename: path of an xlsx or csv file
+    :param path_column: name of the path column; defaults to Chosen_path for
+                        spreadsheets and cleaned_path for csv files
+    :param cache_dir: cache directory; defaults to .path_cache next to the
+                      source file
+    :return: PathCorpus
+    """
+    import pandas as pd
+    is_csv = filename.lower().endswith('.csv')
+    if path_column is None:
+        path_column = 'cleaned_path' if is_csv else 'Chosen_path'
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                                 '.path_cache')
+    cache_base = os.path.join(cache_dir, f'{os.path.basename(filename)}.'
+                                         f'{path_column}')
+    table_file, paths_file = cache_base + '.parquet', cache_base + '.npz'
+
+    signature = file_signature(filename)
+    if os.path.exists(table_file) and os.path.exists(paths_file):
+        # read the members into memory: the archive is read lazily, and it
+        # may be rewritten below
+        with np.load(paths_file) as cached:
+            arrays = {key: cached[key] for key in cached.files}
+        meta = json.loads(str(arrays['meta']))
+        fresh = all(meta['source'][key] == value
+                    for key, value in signature.items())
+        if not fresh:
+            signature = file_signature(filename, digest=True)
+            fresh = meta['source']['sha256'] == signature['sha256']
+            if fresh:  # touched, but the same contents
+                meta['source'] = signature
+                arrays['meta'] = json.dumps(meta)
+                save_archive(paths_file, **arrays)
+        if fresh:
+            return PathCorpus(pd.read_parquet(table_file),
+                              arrays['labels'].tolist(), arrays['ids'],
+                              arrays['offsets'])
+
+    data = pd.read_csv(filename) if is_csv else pd.read_excel(filename)
+    paths = [str(path).split() for path in data[path_column]]
+    labels = ['start', 'end']
+    label_ids = {'start': 0, 'end': 1}
+    for path in paths:
+        for label in path:
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(label)
+    ids, offsets = encode_paths(paths, label_ids)
+    ids = ids.astype(np.int32)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f'{table_file}.{os.getpid()}.tmp'
+    data.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, table_file)
+    meta = {'source': file_signature(filename, digest=True),
+            'path_column': path_column}
+    save_archive(paths_file, labels=np.array(labels), ids=ids,
+                 offsets=offsets, meta=json.dumps(meta))
+    return PathCorpus(data, labels, ids, offsets)
+
+
+def split_path(path):
+    """
+    Return a path as list of labels.
+    :param path: list of labels or space-separated string
+    :return: list of labels
+    """
+    if isinstance(path, str):
+        return path.split()
+    return list(path)
+
+
+def encode_paths(paths, label_ids):
+    """
+    Encode paths as one flat array of label ids, with start and end nodes.
+    :param paths: container node sequences (lists of labels or
+                  space-separated strings)
+    :param label_ids: dict label -> id; unknown labels get id -1
+    :return: flat id array, offsets of the paths in it (len(paths) + 1)
+    """
+    start, end = label_ids['start'], label_ids['end']
+    ids = []
+    offsets = [0]
+    for path in paths:
+        ids.append(start)
+        ids.extend(label_ids.get(label, -1) for label in split_path(path))
+        ids.append(end)
+        offsets.append(len(ids))
+    return np.array(ids, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+
+def window_codes(ids, offsets, n_gram, size):
+    """
+    Encode all n-gram windows that lie within one path.
+    :param ids: flat id array as returned by encode_paths
+    :param offsets: path offsets as returned by encode_paths
+    :param n_gram: n-gram window size as int
+    :param size: vocabulary size (base of the encoding)
+    :return: codes (-1 for windows with unknown labels), window start
+             positions in ids, path index of each window
+    """
+    lengths = np.diff(offsets)
+    n_windows = np.maximum(lengths - n_gram + 1, 0)
+    path_idx = np.repeat(np.arange(len(lengths)), n_windows)
+    starts = offsets[path_idx] + np.arange(n_windows.sum()) - \
+        (np.cumsum(n_windows) - n_windows)[path_idx]
+    codes = np.zeros(len(starts), dtype=np.int64)
+    valid = np.ones(len(starts), dtype=bool)
+    for i in range(n_gram):
+        window_ids = ids[starts + i]
+        valid &= window_ids >= 0
+        codes = codes * size + window_ids
+    return np.where(valid, codes, -1), starts, path_idx
+
+
+def unique_path_ngrams(paths, n_gram, alpha=0.5):
+    """
+    Collapse a corpus to its unique paths and count their n-grams.
+    :param paths: corpus paths (lists of labels or space-separated strings)
+    :param n_gram: n-gram window size as int
+    :param alpha: additive smoothing parameter
+    :return: unique paths (space-separated strings), their multiplicity (int
+             array), NgramModel of the unique paths (its n-grams index the
+             columns), sparse unique path x n-gram count matrix (csr), number
+             of n-grams per unique path (int array)
+    """
+    from scipy import sparse
+    multiplicity = dict()
+    for path in paths:
+        path = ' '.join(split_path(path))
+        multiplicity[path] = multiplicity.get(path, 0) + 1
+    unique_paths = list(multiplicity)
+    multiplicity = np.array(list(multiplicity.values()), dtype=np.int64)
+    model = NgramModel.from_paths(unique_paths, n_gram, alpha)
+    ids, offsets = encode_paths(unique_paths, model.label_ids)
+    codes, _, path_idx = window_codes(ids, offsets, n_gram, len(model.labels))
+    path_ngrams = sparse.csr_matrix(
+        (np.ones(len(codes)), (path_idx, model.find(codes))),
+        shape=(len(unique_paths), model.types))
+    path_lengths = np.bincount(path_idx, minlength=len(unique_paths))
+    return unique_paths, multiplicity, model, path_ngrams, path_lengths
+
+
+class BootstrapEngine:
+    """
+    Bootstrap the learner's scores for a set of test paths.
+    The corpus is collapsed to its unique paths, and their n-gram counts are
+    kept in a sparse path x n-gram matrix. A bootstrap sample (drawing as
+    many paths as in the corpus, with replacement) is then a multinomial
+    weight vector over the unique paths, and its n-gram counts are one
+    matrix product. Samples are drawn and scored in batches.
+    """
+
+    def __init__(self, paths, test_paths, n_gram, alpha=0.5):
+        """
+        :param paths: corpus paths (lists of labels or space-separated strings)
+        :param test_paths: paths to score (without start and end nodes)
+        :param n_gram: n-gram window size as int
+        :param alpha: additive smoothing parameter
+        """
+        from scipy import sparse
+        self.n_gram = n_gram
+        self.alpha = alpha
+        (self.unique_paths, self.multiplicity, self.model, self.path_ngrams,
+         self.path_lengths) = unique_path_ngrams(paths, n_gram, alpha)
+        self.num_paths = int(self.multiplicity.sum())
+        size = len(self.model.labels)
+
+        # test paths; n-grams unseen in the corpus are unattested in any sample
+        self.test_paths = [split_path(path) for path in test_paths]
+        ids, offsets = encode_paths(self.test_paths, self.model.label_ids)
+        codes, starts, path_idx = window_codes(ids, offsets, n_gram, size)
+        self.test_cols = self.model.find(codes)
+        self.test_path_idx = path_idx
+        seen = self.test_cols >= 0
+        self.test_ngrams = sparse.csr_matrix(
+            (np.ones(seen.sum()), (path_idx[seen], self.test_cols[seen])),
+            shape=(len(self.test_paths), self.model.types))
+        self.test_unseen = np.bincount(path_idx[~seen],
+                                       minlength=len(self.test_paths))
+        self.test_lengths = np.bincount(path_idx,
+                                        minlength=len(self.test_paths))
+        padded = [['start'] + path + ['end'] for path in self.test_paths]
+        self.test_ngram_tuples = [
+            tuple(padded[idx][start - offsets[idx]:
+                              start - offsets[idx] + n_gram])
+            for idx, start in zip(path_idx, starts)]
+
+    def scores(self, weights):
+        """
+        Score the test paths under models trained on weighted corpora.
+        :param weights: number of times each unique path is in the sample
+                        (array samples x unique paths)
+        :return: log probs (array samples x test paths), n-gram counts
+                 (array samples x n-grams)
+        """
+        weights = np.atleast_2d(weights)
+        counts = np.asarray((self.path_ngrams.T @ weights.T).T)
+        total = weights @ self.path_lengths
+        types = (counts > 0).sum(axis=1)
+        log_probs = np.asarray(
+            (self.test_ngrams @ np.log(counts + self.alpha).T).T)
+        log_probs = log_probs + self.test_unseen * math.log(self.alpha) \
+            - np.outer(np.log(total + types * self.alpha), self.test_lengths)
+        return log_probs, counts
+
+    def unattested(self, counts):
+        """
+        List the unattested n-grams of every test path, per sample.
+        :param counts: n-gram counts as returned by scores
+        :return: list (samples) of lists (test paths) of n-gram tuples
+        """
+        missing = (self.test_cols < 0) | \
+            (counts[:, np.maximum(self.test_cols, 0)] == 0)
+        result = []
+        for row in missing:
+            sample = [[] for _ in self.test_paths]
+            for w in np.flatnonzero(row):
+                sample[self.test_path_idx[w]].append(self.test_ngram_tuples[w])
+            result.append(sample)
+        return result
+
+    def iter_samples(self, num_samples, seed=None, batch_size=500):
+        """
+        Draw bootstrap samples in batches and score the test paths.
+        :param num_samples: number of bootstrap samples
+        :param seed: seed or numpy Generator for reproducible samples
+        :param batch_size: number of samples per batch
+        :return: generator of (log probs, n-gram counts) per batch, as
+                 returned by scores
+        """
+        rng = np.random.default_rng(seed)
+        probs = self.multiplicity / self.num_paths
+        done = 0
+        while done < num_samples:
+            size = min(batch_size, num_samples - done)
+            weights = rng.multinomial(self.num_paths, probs, size=size)
+            yield self.scores(weights)
+            done += size
+
+    def sample(self, num_samples=1000, seed=None, batch_size=500):
+        """
+        Bootstrap the test path scores.
+        :param num_samples: number of bootstrap samples
+        :param seed: seed or numpy Generator for reproducible samples
+        :param batch_size: number of samples scored at a time
+        :return: log probs (array samples x test paths), unattested n-grams
+                 (list of lists, as returned by unattested)
+        """
+        log_probs = []
+        unattested = []
+        for batch_log_probs, counts in self.iter_samples(num_samples, seed,
+                                                         batch_size):
+            log_probs.append(batch_log_probs)
+            unattested.extend(self.unattested(counts))
+        return np.concatenate(log_probs), unattested
+
+
+class BootstrapSummary:
+    """
+    Online summary of bootstrapped log probabilities, one column per test
+    path. Keeps the count, mean and variance of the log probabilities, the
+    log of the mean raw probability, and a histogram of the log
+    probabilities (bins of width bin_width) for the quantiles. Memory does
+    not depend on the number of samples.
+    """
+
+    def __init__(self, num_columns, bin_width=1e-3):
+        """
+        :param num_columns: number of test paths
+        :param bin_width: histogram bin width in log probability, i.e. the
+                          precision of the quantiles
+        """
+        self.n = 0
+        self.mean = np.zeros(num_columns)
+        self.m2 = np.zeros(num_columns)  # sum of squared deviations
+        self.log_sum_max = np.full(num_columns, -np.inf)
+        self.log_sum_scaled = np.zeros(num_columns)  # sum of exp(x - max)
+        self.bin_width = bin_width
+        self.bin_offset = 0
+        self.hist = np.zeros((num_columns, 0), dtype=np.int64)
+        # sum of exp(x - log_sum_max) of the samples in each bin
+        self.hist_sum = np.zeros((num_columns, 0))
+
+    def update(self, log_probs):
+        """
+        Add a batch of samples.
+        :param log_probs: array samples x test paths
+        """
+        log_probs = np.atleast_2d(log_probs)
+        size = len(log_probs)
+        if not size:
+            return
+        # mean and variance (Chan et al.'s merge of two partitions)
+        batch_mean = log_probs.mean(axis=0)
+        batch_m2 = ((log_probs - batch_mean) ** 2).sum(axis=0)
+        delta = batch_mean - self.mean
+        total = self.n + size
+        self.mean += delta * size / total
+        self.m2 += batch_m2 + delta ** 2 * self.n * size / total
+        self.n = total
+        # running log-sum-exp for the mean raw probability
+        new_max = np.maximum(self.log_sum_max, log_probs.max(axis=0))
+        rescale = np.exp(self.log_sum_max - new_max)
+        scaled = np.exp(log_probs - new_max)
+        self.log_sum_scaled = self.log_sum_scaled * rescale + \
+            scaled.sum(axis=0)
+        self.hist_sum *= rescale[:, None]
+        self.log_sum_max = new_max
+        # histogram, grown to cover the new values
+        bins = np.floor(log_probs / self.bin_width).astype(np.int64)
+        low, high = bins.min(), bins.max()
+        if not self.hist.shape[1]:
+            self.bin_offset = low
+        if low < self.bin_offset or \
+                high >= self.bin_offset + self.hist.shape[1]:
+            new_offset = min(low, self.bin_offset)
+            new_size = max(high + 1, self.bin_offset + self.hist.shape[1]) \
+                - new_offset
+            hist = np.zeros((len(self.mean), new_size), dtype=np.int64)
+            start = self.bin_offset - new_offset
+            hist[:, start:start + self.hist.shape[1]] = self.hist
+            hist_sum = np.zeros(hist.shape)
+            hist_sum[:, start:start + self.hist.shape[1]] = self.hist_sum
+            self.hist = hist
+            self.hist_sum = hist_sum
+            self.bin_offset = new_offset
+        columns = np.broadcast_to(np.arange(len(self.mean)), bins.shape)
+        flat = columns * self.hist.shape[1] + (bins - self.bin_offset)
+        self.hist += np.bincount(flat.ravel(),
+                                 minlength=self.hist.size).reshape(
+                                     self.hist.shape)
+        self.hist_sum += np.bincount(flat.ravel(), weights=scaled.ravel(),
+                                     minlength=self.hist.size).reshape(
+                                         self.hist.shape)
+
+    def variance(self):
+        """
+        :return: sample variance of the log probabilities per test path
+        """
+        return self.m2 / max(self.n - 1, 1)
+
+    def avg_log_prob(self):
+        """
+        :return: log of the mean raw probability per test path
+        """
+        return self.log_sum_max + np.log(self.log_sum_scaled / self.n)
+
+    def order_statistic(self, rank):
+        """
+        :param rank: rank (1 = smallest sample)
+        :return: rank-th smallest log probability per test path (midpoint
+                 of the histogram bin it falls in)
+        """
+        cumulative = self.hist.cumsum(axis=1)
+        bins = (cumulative < rank).sum(axis=1)
+        return (bins + self.bin_offset + 0.5) * self.bin_width
+
+    def cut(self, width=0.95):
+        """
+        :param width: width of the interval
+        :return: number of samples left out at each end of the interval
+        """
+        return int(round(self.n * (1 - width) / 2))
+
+    def interval(self, width=0.95):
+        """
+        Confidence interval as in the R analysis: the smallest and largest
+        of the middle width * n samples (for 1000 samples, the 26th and the
+        975th).
+        :param width: width of the interval
+        :return: lower and upper bound per test path
+        """
+        cut = self.cut(width)
+        return self.order_statistic(cut + 1), self.order_statistic(self.n - cut)
+
+    def trimmed_avg_log_prob(self, width=0.95):
+        """
+        Log of the mean raw probability of the middle width * n samples, as
+        avg_log_prob in the R analysis (for 1000 samples, the 26th to the
+        975th). The samples of a bin are summed exactly; only the two bins at
+        the ends of the interval, which may be partly inside it, are counted
+        with the mean of their samples.
+        :param width: width of the interval
+        :return: trimmed log mean raw probability per test path
+        """
+        cut = self.cut(width)
+        cumulative = self.hist.cumsum(axis=1)
+        inside = np.clip(cumulative, cut, self.n - cut)
+        inside = np.diff(inside, axis=1, prepend=cut)  # samples per bin
+        bin_means = np.divide(self.hist_sum, self.hist,
+                              out=np.zeros(self.hist.shape),
+                              where=self.hist > 0)
+        total = (inside * bin_means).sum(axis=1)
+        return self.log_sum_max + np.log(total / (self.n - 2 * cut))
+
+
+def run_bootstrap(engine, num_samples, conditions, seed=None,
+                  batch_size=500, interval=0.95, bin_width=1e-3,
+                  raw_file=None):
+    """
+    Run a bootstrap with online summaries instead of collecting every sample.
+    :param engine: BootstrapEngine with the test paths
+    :param num_samples: number of bootstrap samples
+    :param conditions: dict of columns (e.g. condition, distance, structure,
+                       dependency, n_gram) with one value per test path
+    :param seed: seed or numpy Generator for reproducible samples
+    :param batch_size: number of samples drawn and scored at a time
+    :param interval: width of the confidence interval
+    :param bin_width: precision of the interval bounds in log probability
+    :param raw_file: optional parquet file to write all samples to, in
+                     chunks (one row per sample and test path)
+    :return: pandas DataFrame with one row per test path: the conditions
+             columns, n, lower, upper and avg_log_prob as in the R analysis
+             (over the samples inside the interval), and samples,
+             mean_log_prob and var_log_prob over all samples
+    """
+    import pandas as pd
+    summary = BootstrapSummary(len(engine.test_paths), bin_width)
+    writer = None
+    if raw_file is not None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    try:
+        for log_probs, _ in engine.iter_samples(num_samples, seed,
+                                                batch_size):
+            if raw_file is not None:
+                sample_num = summary.n + 1 + np.arange(len(log_probs))
+                columns = {key: np.tile(np.asarray(values), len(log_probs))
+                           for key, values in conditions.items()}
+                columns['path'] = np.tile(
+                    [' '.join(path) for path in engine.test_paths],
+                    len(log_probs))
+                columns['log_probability'] = log_probs.ravel()
+                columns['bootstrap_sample'] = np.repeat(
+                    sample_num, len(engine.test_paths))
+                table = pa.table(columns)
+                if writer is None:
+                    writer = pq.ParquetWriter(raw_file, table.schema)
+                writer.write_table(table)
+            summary.update(log_probs)
+    finally:
+        if writer is not None:
+            writer.close()
+    result = pd.DataFrame(conditions)
+    result['path'] = [' '.join(path) for path in engine.test_paths]
+    result['n'] = summary.n - 2 * summary.cut(interval)
+    result['lower'], result['upper'] = summary.interval(interval)
+    result['avg_log_prob'] = summary.trimmed_avg_log_prob(interval)
+    result['samples'] = summary.n
+    result['mean_log_prob'] = summary.mean
+    result['var_log_prob'] = summary.variance()
+    return result
+
+
+class HeldOutEvaluator:
+    """
+    Held-out evaluation of the learner on its own corpus. A model trained
+    without some paths has the corpus counts minus the counts of those
+    paths, so held-out scores are computed by subtracting the paths' own
+    n-gram counts (and tokens, and the types they alone attest) from the
+    shared totals, for all unique paths at once.
+    """
+
+    def __init__(self, paths, n_gram, alpha=0.5):
+        """
+        :param paths: corpus paths (lists of labels or space-separated strings)
+        :param n_gram: n-gram window size as int
+        :param alpha: additive smoothing parameter
+        """
+        self.n_gram = n_gram
+        self.alpha = alpha
+        (self.unique_paths, self.multiplicity, self.model, self.path_ngrams,
+         self.path_lengths) = unique_path_ngrams(paths, n_gram, alpha)
+        self.num_paths = int(self.multiplicity.sum())
+        self.counts = self.multiplicity @ self.path_ngrams  # corpus counts
+        self.total = int(self.multiplicity @ self.path_lengths)
+
+    def leave_one_out(self):
+        """
+        Score every unique path under the model trained on the corpus without
+        one of its occurrences.
+        :return: log probs (float array aligned with unique_paths), number of
+                 n-grams of each path that are unattested without it
+        """
+        entries = self.path_ngrams.tocoo()
+        held_counts = self.counts[entries.col] - entries.data
+        num_paths = len(self.unique_paths)
+        lost_types = np.bincount(entries.row, weights=held_counts == 0,
+                                 minlength=num_paths)
+        unattested = np.bincount(entries.row,
+                                 weights=entries.data * (held_counts == 0),
+                                 minlength=num_paths).astype(np.int64)
+        totals = self.total - self.path_lengths
+        types = self.model.types - lost_types
+        log_probs = np.bincount(entries.row,
+                                weights=entries.data
+                                * np.log(held_counts + self.alpha),
+                                minlength=num_paths) \
+            - self.path_lengths * np.log(totals + types * self.alpha)
+        return log_probs, unattested
+
+    def leave_one_out_perplexity(self):
+        """
+        :return: per n-gram perplexity of the corpus under leave-one-out
+        """
+        log_probs, _ = self.leave_one_out()
+        return math.exp(-(self.multiplicity @ log_probs) / self.total)
+
+    def k_fold(self, k=10, seed=None):
+        """
+        K-fold held-out evaluation: the corpus paths are randomly split into
+        k folds, and each fold is scored under the model trained on the rest.
+        :param k: number of folds
+        :param seed: seed or numpy Generator for a reproducible split
+        :return: DataFrame with one row per fold: fold, num_paths, num_ngrams,
+                 log_likelihood, perplexity (per n-gram)
+        """
+        import pandas as pd
+        rng = np.random.default_rng(seed)
+        path_idx = np.repeat(np.arange(len(self.unique_paths)),
+                             self.multiplicity)
+        folds = rng.permutation(self.num_paths) % k
+        weights = np.zeros((k, len(self.unique_paths)), dtype=np.int64)
+        np.add.at(weights, (folds, path_idx), 1)
+
+        held_ngrams = np.asarray((self.path_ngrams.T @ weights.T).T)
+        counts = self.counts - held_ngrams
+        num_ngrams = weights @ self.path_lengths
+        totals = self.total - num_ngrams
+        types = (counts > 0).sum(axis=1)
+        log_probs = np.asarray(
+            (self.path_ngrams @ np.log(counts + self.alpha).T).T) \
+            - np.outer(np.log(totals + types * self.alpha),
+                       self.path_lengths)
+        log_likelihood = (weights * log_probs).sum(axis=1)
+        return pd.DataFrame({'fold': np.arange(1, k + 1),
+                             'num_paths': weights.sum(axis=1),
+                             'num_ngrams': num_ngrams,
+                             'log_likelihood': log_likelihood,
+                             'perplexity': np.exp(-log_likelihood
+                                                  / num_ngrams)})
+
+
+def sum_by_path(values, path_idx, num_paths):
+    """
+    Sum per-position values by path, for every row.
+    :param values: array rows x positions
+    :param path_idx: path index of each position
+    :param num_paths: number of paths
+    :return: array rows x paths
+    """
+    flat = (np.arange(len(values))[:, None] * num_paths + path_idx).ravel()
+    return np.bincount(flat, weights=values.ravel(),
+                       minlength=len(values) * num_paths
+                       ).reshape(len(values), num_paths)
+
+
+class SmoothingSweep:
+    """
+    Evaluate test paths under a grid of smoothing parameters, n-gram orders
+    and smoothing schemes, from one set of counts (all orders up to max_order
+    are counted once from the same interned corpus).
+    Schemes:
+    - additive: the learner's joint n-gram estimate (c + alpha) / (N + T alpha)
+      as in get_prob
+    - interpolated: conditional estimate interpolated with the next lower
+      order, P(w|h) = (c(hw) + alpha V P(w|h')) / (c(h) + alpha V)
+    - backoff: conditional estimate that keeps c(hw) / (c(h) + alpha T(h)) for
+      n-grams seen after h and gives the rest, alpha T(h) / (c(h) + alpha T(h)),
+      to the unseen ones in proportion to P(w|h')
+    Both conditional schemes end in the additive unigram estimate, where V is
+    the number of labels that can follow start (end included) plus one slot
+    for unknown labels. Paths are scored from their first label on; near the
+    start, shorter histories are used. Per-context counts and type counts are
+    precomputed; alpha values are evaluated together as one array axis.
+    Further schemes can be added to the schemes dict of a sweep, as functions
+    (sweep, ids, offsets, n_gram, alphas) -> log probs (alphas x paths).
+    """
+
+    def __init__(self, paths, max_order=3):
+        """
+        :param paths: corpus paths (lists of labels or space-separated strings)
+        :param max_order: highest n-gram order to count
+        """
+        labels = ['start', 'end']
+        label_ids = {'start': 0, 'end': 1}
+        paths = [split_path(path) for path in paths]
+        for path in paths:
+            for label in path:
+                if label not in label_ids:
+                    label_ids[label] = len(labels)
+                    labels.append(label)
+        self.labels = labels
+        self.label_ids = label_ids
+        self.size = len(labels)
+        self.max_order = max_order
+        ids, offsets = encode_paths(paths, label_ids)
+        self.models = dict()
+        self.contexts = dict()
+        for k in range(1, max_order + 1):
+            codes, _, _ = window_codes(ids, offsets, k, self.size)
+            codes, counts = np.unique(codes, return_counts=True)
+            self.models[k] = NgramModel(labels, k, codes, counts)
+            if k > 1:
+                # context h of every attested hw: its count and number of types
+                context_codes, context_idx = np.unique(codes // self.size,
+                                                       return_inverse=True)
+                self.contexts[k] = (context_codes, context_idx,
+                                    np.bincount(context_idx, weights=counts),
+                                    np.bincount(context_idx))
+        # the unigram distribution is over predicted labels: start excluded
+        self.unigram_total = self.models[1].total - \
+            int(self.models[1].lookup([label_ids['start']])[0])
+        self.vocab_size = self.size
+        self._backoff_mass = dict()
+        self.schemes = {'additive': SmoothingSweep.additive,
+                        'interpolated': SmoothingSweep.interpolated,
+                        'backoff': SmoothingSweep.backoff}
+
+    def encode(self, grams):
+        """
+        :param grams: label id matrix (rows are n-grams, -1 for unknown or
+                      missing labels)
+        :return: codes (-1 for n-grams with unknown or missing labels)
+        """
+        codes = np.zeros(len(grams), dtype=np.int64)
+        for i in range(grams.shape[1]):
+            codes = codes * self.size + grams[:, i]
+        return np.where((grams >= 0).all(axis=1), codes, -1)
+
+    def context_stats(self, k, grams):
+        """
+        :param k: n-gram order (> 1)
+        :param grams: label id matrix of k-grams
+        :return: count of the contexts (first k-1 labels) as contexts, number
+                 of label types seen after them, their index in
+                 self.contexts[k] (-1 if unseen)
+        """
+        context_codes, _, context_counts, context_types = self.contexts[k]
+        codes = self.encode(grams[:, :-1])
+        pos = np.searchsorted(context_codes, codes)
+        pos[pos == len(context_codes)] = 0
+        pos = np.where((codes >= 0) & (context_codes[pos] == codes), pos, -1)
+        return (np.where(pos >= 0, context_counts[pos], 0),
+                np.where(pos >= 0, context_types[pos], 0), pos)
+
+    def conditional(self, k, grams, alphas, scheme):
+        """
+        Conditional probability of the last label of each k-gram given the
+        others.
+        :param k: n-gram order
+        :param grams: label id matrix of k-grams (-1 for unknown labels, or
+                      missing history labels near the start of a path)
+        :param alphas: smoothing parameters (float array)
+        :param scheme: interpolated or backoff
+        :return: probabilities (array alphas x n-grams)
+        """
+        alphas = np.asarray(alphas, dtype=float)[:, None]
+        if k == 1:
+            counts = np.where(grams[:, 0] >= 0,
+                              self.models[1].lookup(grams[:, 0]), 0)
+            return (counts + alphas) / \
+                (self.unigram_total + alphas * self.vocab_size)
+        lower = self.conditional(k - 1, grams[:, 1:], alphas[:, 0], scheme)
+        counts = self.models[k].lookup(self.encode(grams))
+        context_counts, context_types, context_pos = \
+            self.context_stats(k, grams)
+        if scheme == 'interpolated':
+            return (counts + alphas * self.vocab_size * lower) / \
+                (context_counts + alphas * self.vocab_size)
+        unseen_mass = self.backoff_mass(k, alphas[:, 0])
+        norm = context_counts + alphas * context_types
+        seen = counts / np.where(norm > 0, norm, 1)
+        backoff = alphas * context_types / np.where(norm > 0, norm, 1) \
+            / unseen_mass[:, np.maximum(context_pos, 0)] * lower
+        return np.where(context_counts == 0, lower,
+                        np.where(counts > 0, seen, backoff))
+
+    def backoff_mass(self, k, alphas):
+        """
+        Lower-order probability left to the labels not seen after each
+        context, 1 - sum of P(w|h') over the w seen after h (memoized).
+        :param k: n-gram order (> 1)
+        :param alphas: smoothing parameters (float array)
+        :return: array alphas x contexts of order k
+        """
+        key = (k, tuple(alphas))
+        if key not in self._backoff_mass:
+            model = self.models[k]
+            grams = np.stack([model.codes // self.size ** (k - 1 - i)
+                              % self.size for i in range(k)], axis=1)
+            lower = self.conditional(k - 1, grams[:, 1:], alphas, 'backoff')
+            _, context_idx, _, _ = self.contexts[k]
+            num_contexts = len(self.contexts[k][0])
+            seen = np.bincount(
+                (np.arange(len(alphas))[:, None] * num_contexts
+                 + context_idx).ravel(), weights=lower.ravel(),
+                minlength=len(alphas) * num_contexts)
+            self._backoff_mass[key] = 1 - seen.reshape(len(alphas),
+                                                       num_contexts)
+        return self._backoff_mass[key]
+
+    def history_grams(self, ids, offsets, n_gram):
+        """
+        :param ids: flat id array as returned by encode_paths
+        :param offsets: path offsets as returned by encode_paths
+        :param n_gram: n-gram order
+        :return: label id matrix with one n-gram per predicted position (every
+                 position after start; missing history labels are -1), path
+                 index of each position
+        """
+        lengths = np.diff(offsets) - 1
+        path_idx = np.repeat(np.arange(len(lengths)), lengths)
+        positions = np.arange(len(ids))
+        positions = positions[np.isin(positions, offsets[:-1], invert=True)]
+        grams = np.full((len(positions), n_gram), -1, dtype=np.int64)
+        for i in range(n_gram):
+            source = positions - (n_gram - 1 - i)
+            inside = source >= offsets[path_idx]
+            grams[inside, i] = ids[source[inside]]
+        return grams, path_idx
+
+    def additive(self, ids, offsets, n_gram, alphas):
+        """
+        :param ids: flat id array as returned by encode_paths
+        :param offsets: path offsets as returned by encode_paths
+        :param n_gram: n-gram order
+        :param alphas: smoothing parameters (float array)
+        :return: log probs under the learner's additive scheme (array
+                 alphas x paths)
+        """
+        model = self.models[n_gram]
+        codes, _, path_idx = window_codes(ids, offsets, n_gram, self.size)
+        alphas = np.asarray(alphas, dtype=float)[:, None]
+        log_probs = np.log(model.lookup(codes) + alphas) - \
+            np.log(model.total + model.types * alphas)
+        return sum_by_path(log_probs, path_idx, len(offsets) - 1)
+
+    def interpolated(self, ids, offsets, n_gram, alphas):
+        """
+        :return: log probs under the interpolated scheme (see additive)
+        """
+        grams, path_idx = self.history_grams(ids, offsets, n_gram)
+        probs = self.conditional(n_gram, grams, alphas, 'interpolated')
+        return sum_by_path(np.log(probs), path_idx, len(offsets) - 1)
+
+    def backoff(self, ids, offsets, n_gram, alphas):
+        """
+        :return: log probs under the backoff scheme (see additive)
+        """
+        grams, path_idx = self.history_grams(ids, offsets, n_gram)
+        probs = self.conditional(n_gram, grams, alphas, 'backoff')
+        return sum_by_path(np.log(probs), path_idx, len(offsets) - 1)
+
+    def sweep(self, test, alphas=(0.5,), n_grams=(2, 3), schemes=None):
+        """
+        Score test paths for every combination of smoothing scheme, n-gram
+        order and alpha.
+        :param test: paths to score (without start and end nodes), or a
+                     DataFrame with a path column (e.g. the condition table of
+                     run_experiments); its other columns are kept
+        :param alphas: smoothing parameters
+        :param n_grams: n-gram orders (at most max_order)
+        :param schemes: names in self.schemes (default: all)
+        :return: tidy DataFrame with one row per scheme, n_gram, alpha and
+                 test path, and a log_probability column
+        """
+        import pandas as pd
+        if not isinstance(test, pd.DataFrame):
+            test = pd.DataFrame({'path': [' '.join(split_path(path))
+                                          for path in test]})
+        schemes = list(self.schemes) if schemes is None else list(schemes)
+        alphas = np.asarray(alphas, dtype=float)
+        ids, offsets = encode_paths(list(test['path']), self.label_ids)
+        tables = []
+        for scheme in schemes:
+            for n_gram in n_grams:
+                if n_gram > self.max_order:
+                    raise ValueError(f'{n_gram}-grams were not counted '
+                                     f'(max_order={self.max_order})')
+                log_probs = self.schemes[scheme](self, ids, offsets, n_gram,
+                                                 alphas)
+                for a, alpha in enumerate(alphas):
+                    table = test.copy()
+                    table['scheme'] = scheme
+                    table['n_gram'] = n_gram
+                    table['alpha'] = alpha
+                    table['log_probability'] = log_probs[a]
+                    tables.append(table)
+        return pd.concat(tables, ignore_index=True)
+
+
+class PathLattice:
+    """
+    Exact queries over all container node paths under a trained NgramModel.
+    The model's scores form a weighted state graph: a state is the last
+    n-1 nodes, and adding a node multiplies the path probability by the
+    smoothed probability of the completed n-gram (unattested n-grams
+    included). Dynamic programming over this graph gives the probability
+    mass of all paths per length, and the probability of passing through a
+    label, in polynomial time in the number of labels; best-first search
+    guided by the exact cost to reach end gives the k most probable paths.
+    Paths shorter than n - 2 labels contain no n-gram and are left out.
+    """
+
+    def __init__(self, model):
+        """
+        :param model: NgramModel
+        """
+        self.model = model
+        self.n_gram = model.n_gram
+        self.size = len(model.labels)
+        self.start = model.label_ids['start']
+        self.end = model.label_ids['end']
+        self.mid = np.array([i for i in range(self.size)
+                             if i not in (self.start, self.end)])
+        log_weights = np.full(self.size ** self.n_gram,
+                              math.log(model.alpha) - model.log_norm)
+        log_weights[model.codes] = np.log(model.counts + model.alpha) - \
+            model.log_norm
+        self.log_weights = log_weights.reshape((self.size,) * self.n_gram)
+        self._cost_to_end = None
+
+    def log_mass_by_length(self, max_length, exclude=()):
+        """
+        Total probability of all paths of each length (forward algorithm).
+        :param max_length: longest path length (number of labels)
+        :param exclude: labels that may not occur in the paths
+        :return: log mass per length 1..max_length (float array, nan for
+                 lengths without n-grams)
+        """
+        from scipy.special import logsumexp
+        mid = np.array([i for i in self.mid
+                        if self.model.labels[i] not in exclude], dtype=int)
+        result = np.full(max_length, np.nan)
+        if self.n_gram == 1:
+            step = logsumexp(self.log_weights[mid]) if len(mid) else -np.inf
+            lengths = np.arange(1, max_length + 1)
+            return self.log_weights[self.start] + lengths * step + \
+                self.log_weights[self.end]
+        # states: the first n-1 nodes, start followed by n-2 labels
+        alpha = np.full((self.size,) * (self.n_gram - 1), -np.inf)
+        alpha[(self.start,) + np.ix_(*[mid] * (self.n_gram - 2))] = 0
+        length = self.n_gram - 2
+        not_mid = np.ones(self.size, dtype=bool)
+        not_mid[mid] = False
+        while length <= max_length:
+            if length >= 1:
+                result[length - 1] = logsumexp(
+                    alpha + self.log_weights[..., self.end])
+            alpha = logsumexp(alpha[..., None] + self.log_weights, axis=0)
+            alpha[..., not_mid] = -np.inf
+            length += 1
+        return result
+
+    def pass_through(self, label, max_length):
+        """
+        Probability that a path passes through a label, among the paths of
+        each length and among all paths up to max_length.
+        :param label: label (e.g. COMP_wh-int)
+        :param max_length: longest path length (number of labels)
+        :return: probability per length 1..max_length (float array),
+                 probability over all lengths up to max_length
+        """
+        total = self.log_mass_by_length(max_length)
+        avoiding = self.log_mass_by_length(max_length, exclude=(label,))
+        per_length = -np.expm1(avoiding - total)
+        valid = ~np.isnan(total)
+        overall = -math.expm1(np.logaddexp.reduce(avoiding[valid])
+                              - np.logaddexp.reduce(total[valid]))
+        return per_length, overall
+
+    def cost_to_end(self):
+        """
+        :return: least -log probability to finish a path from each state
+                 (array over the last n-1 nodes; shortest paths to end)
+        """
+        if self._cost_to_end is None:
+            cost = -self.log_weights
+            if self.n_gram == 1:
+                self._cost_to_end = cost[self.end]
+            else:
+                h = cost[..., self.end].copy()
+                while True:
+                    via_label = (cost[..., self.mid] + h[None][..., self.mid]
+                                 ).min(axis=-1)
+                    new_h = np.minimum(cost[..., self.end], via_label)
+                    if np.array_equal(new_h, h):
+                        break
+                    h = new_h
+                self._cost_to_end = h
+        return self._cost_to_end
+
+    def k_best(self, k=10, max_length=None):
+        """
+        The k most probable paths, by best-first search over path prefixes.
+        As every n-gram has probability below 1, prefixes only lose
+        probability, and the cost to end bounds what they can still reach,
+        so paths come out in order of probability.
+        :param k: number of paths
+        :param max_length: longest path length (number of labels), optional
+        :return: list of (log prob, path as list of labels)
+        """
+        import heapq
+        cost = -self.log_weights
+        h = self.cost_to_end()
+        n = self.n_gram
+
+        def heuristic(nodes):
+            if n == 1:
+                return h
+            if len(nodes) >= n - 1:
+                return h[tuple(nodes[-(n - 1):])]
+            return 0.0
+
+        def extend(nodes, g, node):
+            nodes = nodes + (node,)
+            if len(nodes) >= n:
+                g += cost[nodes[-n:]]
+            return nodes, g
+
+        first = (self.start,)
+        g = cost[self.start] if n == 1 else 0.0
+        queue = [(g + heuristic(first), g, 0, first)]
+        pushed = 1
+        result = []
+        while queue and len(result) < k:
+            _, g, _, nodes = heapq.heappop(queue)
+            if nodes[-1] == self.end:
+                if len(nodes) - 2 >= max(1, n - 2):
+                    result.append((-float(g), [self.model.labels[i]
+                                               for i in nodes[1:-1]]))
+                continue
+            nexts = [self.end]
+            if max_length is None or len(nodes) - 1 < max_length:
+                nexts += list(self.mid)
+            for node in nexts:
+                new_nodes, new_g = extend(nodes, g, node)
+                f = new_g if node == self.end else \
+                    new_g + heuristic(new_nodes)
+                heapq.heappush(queue, (f, new_g, pushed, new_nodes))
+                pushed += 1
+        return result
+
+
+class TrieScorer:
+    """
+    Score candidate paths that share prefixes. Paths are inserted into a
+    prefix trie whose root is the start node; every trie node stores the
+    cumulative log probability of its prefix and the count of the n-gram
+    ending in it, so each distinct prefix is scored once, in vectorized
+    batches per trie depth. The trie is kept between calls, so later batches
+    only pay for new prefixes.
+    """
+
+    def __init__(self, model):
+        """
+        :param model: NgramModel
+        """
+        self.model = model
+        self.n_gram = model.n_gram
+        self.size = len(model.labels)
+        start = model.label_ids['start']
+        # per trie node: parent, label, depth, children
+        self.parents = [-1]
+        self.labels = ['start']
+        self.depths = [0]
+        self.children = [dict()]
+        # per scored trie node: last n-1 ids (-2 before start), cumulative
+        # log prob, count of the n-gram ending in it (-1: prefix shorter
+        # than n), last n-1 labels, unattested n-grams of the prefix
+        self.histories = np.full((1, self.n_gram - 1), -2, dtype=np.int64)
+        self.cumulative = np.zeros(1)
+        self.counts = np.full(1, -1, dtype=np.int64)
+        self.suffixes = [('start',)[:self.n_gram - 1]]
+        self.missing = [()]
+        if self.n_gram > 1:
+            self.histories[0, -1] = start
+        else:
+            self.counts, self.cumulative = self.window_log_probs(
+                self.histories, np.array([start]))
+            if self.counts[0] == 0:
+                self.missing = [(('start',),)]
+
+    def __len__(self):
+        return len(self.parents)
+
+    def insert(self, path):
+        """
+        :param path: container node sequence (list of labels or
+                     space-separated string)
+        :return: trie node of the full path
+        """
+        node = 0
+        for label in split_path(path):
+            child = self.children[node].get(label)
+            if child is None:
+                child = len(self.parents)
+                self.parents.append(node)
+                self.labels.append(label)
+                self.depths.append(self.depths[node] + 1)
+                self.children.append(dict())
+                self.children[node][label] = child
+            node = child
+        return node
+
+    def window_log_probs(self, histories, ids):
+        """
+        :param histories: last n-1 ids before each window (-2 before start)
+        :param ids: last id of each window (-1 for unknown labels)
+        :return: counts (-1 for windows reaching before start, which are not
+                 scored), log probs (0 for those)
+        """
+        windows = np.column_stack([histories, ids])
+        complete = windows[:, 0] != -2
+        codes = np.zeros(len(ids), dtype=np.int64)
+        for i in range(self.n_gram):
+            codes = codes * self.size + windows[:, i]
+        codes = np.where((windows >= 0).all(axis=1), codes, -1)
+        counts = np.where(complete, self.model.lookup(codes), -1)
+        log_probs = np.where(complete,
+                             np.log(np.maximum(counts, 0) + self.model.alpha)
+                             - self.model.log_norm, 0.0)
+        return counts, log_probs
+
+    def update(self):
+        """
+        Score the trie nodes added since the last update, depth by depth
+        (parents before children).
+        """
+        first = len(self.cumulative)
+        num_new = len(self.parents) - first
+        if not num_new:
+            return
+        label_ids = self.model.label_ids
+        parents = np.array(self.parents[first:], dtype=np.int64)
+        depths = np.array(self.depths[first:], dtype=np.int64)
+        ids = np.array([label_ids.get(label, -1)
+                        for label in self.labels[first:]], dtype=np.int64)
+        self.histories = np.vstack(
+            [self.histories, np.empty((num_new, self.n_gram - 1),
+                                      dtype=np.int64)])
+        self.cumulative = np.concatenate([self.cumulative, np.zeros(num_new)])
+        self.counts = np.concatenate([self.counts,
+                                      np.zeros(num_new, dtype=np.int64)])
+        self.suffixes.extend([None] * num_new)
+        self.missing.extend([None] * num_new)
+        for depth in np.unique(depths):
+            at_depth = np.flatnonzero(depths == depth)
+            nodes = first + at_depth
+            parent_histories = self.histories[parents[at_depth]]
+            counts, log_probs = self.window_log_probs(parent_histories,
+                                                      ids[at_depth])
+            self.counts[nodes] = counts
+            self.cumulative[nodes] = self.cumulative[parents[at_depth]] + \
+                log_probs
+            self.histories[nodes] = np.column_stack(
+                [parent_histories, ids[at_depth]])[:, 1:]
+            for node, parent, count in zip(nodes.tolist(),
+                                           parents[at_depth].tolist(),
+                                           counts.tolist()):
+                window = self.suffixes[parent] + (self.labels[node],)
+                self.suffixes[node] = \
+                    window[max(len(window) + 1 - self.n_gram, 0):] \
+                    if self.n_gram > 1 else ()
+                self.missing[node] = self.missing[parent] + (window,) \
+                    if count == 0 else self.missing[parent]
+
+    def score(self, paths):
+        """
+        Score a batch of paths (without start and end nodes).
+        :param paths: container node sequences (lists of labels or
+                      space-separated strings)
+        :return: log probs (float array), list of unattested n-grams per path
+        """
+        leaves = np.array([self.insert(path) for path in paths],
+                          dtype=np.int64)
+        self.update()
+        end_ids = np.full(len(leaves), self.model.label_ids['end'])
+        end_counts, end_log_probs = self.window_log_probs(
+            self.histories[leaves], end_ids)
+        log_probs = self.cumulative[leaves] + end_log_probs
+        unattested = [self.unattested(leaf, end_count)
+                      for leaf, end_count
+                      in zip(leaves.tolist(), end_counts.tolist())]
+        return log_probs, unattested
+
+    def unattested(self, node, end_count):
+        """
+        :param node: trie node of a full path
+        :param end_count: count of the n-gram ending in end
+        :return: unattested n-grams of the path, in path order
+        """
+        if end_count == 0:
+            return list(self.missing[node]) + [self.suffixes[node] + ('end',)]
+        return list(self.missing[node])
+
+
 def plot_log_prob_simple(p_short_1, p_long_1, p_short_2, p_long_2,
-                         label1='No island', label2='Island', title='test plot'):
+                         label1='No island', label2='Island', title='test plot',
+                         filename=None):
+    """
+    Plot the log probabilities of one condition with pyplot (for many
+    conditions at once, see plot_conditions.plot_conditions).
+    :param filename: save the plot to this file and close the figure
+    """
     import matplotlib.pyplot as plt
+    from plot_conditions import draw_log_prob
     fig, ax = plt.subplots(1)
-    ax.set_title(title)
-    ax.plot([0,1], [p_short_1, p_long_1], marker = 'o', label=label1,
-            color='black')
-    ax.plot([0,1], [p_short_2, p_long_2], marker = 'o', linestyle='--',
-            label=label2,
-            color='black')
-    ax.set_ylabel('Log Probability')
-    ax.set_xlabel('Distance')
-    ax.set_xticks([0,1])
-    ax.set_xticklabels(['Short', 'Long'])
-    ax.grid(True)
-    ax.legend()
+    draw_log_prob(ax, p_short_1, p_long_1, p_short_2, p_long_2, label1,
+                  label2, title, ylim=None)
     plt.tight_layout()
     plt.ylim([-38, 0])
-    # plt.savefig(title+".png", format="png")  # to save the plot
+    if filename is not None:
+        fig.savefig(filename)
+        plt.close(fig)
 
 
 def main():
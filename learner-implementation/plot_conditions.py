@@ -0,0 +1,295 @@
+"""
+Batch plots of the learner's log probabilities per island condition.
+
+Every condition is drawn as in plot_log_prob_simple (short/long distance,
+island and no-island lines), as small multiples: one figure per group of a
+results table (e.g. per dependency and n-gram order, or per smoothing
+setting of a sweep), with one panel per condition. Figures are drawn on the
+non-interactive Agg canvas, without pyplot, and one figure is reused for all
+pages of a process: only the data and titles of its lines change from page
+to page, so nothing is left open and the axes are not rebuilt. For png pages
+with fixed y limits that hold all values, the static part of the figure
+(axes, ticks, grid, legend) is drawn once, and every page only restores it
+and draws the lines and titles on top.
+
+Pages are rendered serially by default. Rendering them in a pool of
+processes (--processes) is experimental: every worker builds its own figure
+and imports matplotlib, and on the sweep tables this costs more than it
+saves (4 processes took 11.3 s where the serial run took 9.1 s).
+
+Usage:
+    python plot_conditions.py ../results-visualization/data/model_results_*.csv
+    python plot_conditions.py smoothing_sweep_rc.csv \\
+        --group-by dependency scheme n_gram alpha -o plots
+"""
+import argparse
+import glob
+import math
+import os
+import re
+
+# cells of a condition, in the order of plot_log_prob_simple's arguments
+CELLS = [('Short', 'noIsland'), ('Long', 'noIsland'), ('Short', 'Island'),
+         ('Long', 'Island')]
+
+
+def draw_log_prob(ax, p_short_1, p_long_1, p_short_2, p_long_2,
+                  label1='No island', label2='Island', title='',
+                  ylim=(-38, 0), legend=True):
+    """
+    Draw the log probabilities of one condition into an axes.
+    :param ax: matplotlib Axes
+    :param p_short_1: log prob of the short no-island cell
+    :param p_long_1: log prob of the long no-island cell
+    :param p_short_2: log prob of the short island cell
+    :param p_long_2: log prob of the long island cell
+    :param label1: legend label of the no-island line
+    :param label2: legend label of the island line
+    :param title: title of the axes
+    :param ylim: y axis limits (None: automatic)
+    :param legend: draw the legend
+    :return: the no-island and island lines
+    """
+    ax.set_title(title)
+    line1, = ax.plot([0, 1], [p_short_1, p_long_1], marker='o', label=label1,
+                     color='black')
+    line2, = ax.plot([0, 1], [p_short_2, p_long_2], marker='o',
+                     linestyle='--', label=label2, color='black')
+    ax.set_ylabel('Log Probability')
+    ax.set_xlabel('Distance')
+    ax.set_xticks([0, 1])
+    ax.set_xticklabels(['Short', 'Long'])
+    ax.grid(True)
+    if legend:
+        ax.legend()
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    return line1, line2
+
+
+def condition_panels(table):
+    """
+    :param table: DataFrame with columns condition, distance, structure and
+                  log_probability (e.g. a model_results table)
+    :return: list of (condition, log probs of the cells in CELLS order), in
+             the order of the table
+    """
+    values = {}
+    for condition, distance, structure, log_prob in zip(
+            table['condition'], table['distance'], table['structure'],
+            table['log_probability']):
+        values.setdefault(condition, {})[distance, structure] = log_prob
+    return [(condition, [cells.get(cell, math.nan) for cell in CELLS])
+            for condition, cells in values.items()]
+
+
+class PageRenderer:
+    """
+    A reusable figure with a grid of panels, rendered on the Agg canvas.
+    """
+
+    def __init__(self, num_panels, ncols=5, panel_size=(3.2, 2.6), dpi=100):
+        """
+        :param num_panels: largest number of panels of a page
+        :param ncols: number of panels per row
+        :param panel_size: size of a panel in inches
+        :param dpi: resolution of raster output
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        ncols = max(min(ncols, num_panels), 1)
+        nrows = max(math.ceil(num_panels / ncols), 1)
+        self.figure = Figure(figsize=(panel_size[0] * ncols,
+                                      panel_size[1] * nrows + 0.5), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(nrows, ncols, squeeze=False).ravel()
+        self.figure.subplots_adjust(
+            left=0.6 / (panel_size[0] * ncols), right=0.98,
+            bottom=0.5 / self.figure.get_figheight(),
+            top=1 - 0.6 / self.figure.get_figheight(),
+            wspace=0.35, hspace=0.6)
+        self.title = self.figure.suptitle('')
+        self.lines = []
+        for i, ax in enumerate(self.axes):
+            self.lines.append(draw_log_prob(ax, *[math.nan] * 4,
+                                            legend=False))
+            if i == 0:  # fixed position: the same on every page
+                ax.legend(loc='lower left')
+            ax.title.set_y(1.0)  # fixed position: no layout pass per draw
+            ax.set_xlim(-0.05, 1.05)  # the margins of autoscaling
+            # axis labels on the outer panels only
+            if i % ncols:
+                ax.set_ylabel('')
+            if i < ncols * (nrows - 1):
+                ax.set_xlabel('')
+        # artists that change from page to page
+        self.changing = [self.title] + [ax.title for ax in self.axes] + \
+            [line for lines in self.lines for line in lines]
+        self.background = None  # (ylim, saved static part of the figure)
+
+    def render(self, filename, title, panels, ylim=(-38, 0), fast=True):
+        """
+        Draw one page and write it to a file.
+        :param filename: output file (format from its extension)
+        :param title: title of the page
+        :param panels: list of (condition, log probs) as returned by
+                       condition_panels
+        :param ylim: y axis limits of every panel (None: automatic)
+        :param fast: blit full png pages with fixed y limits that hold all
+                     values (False: always draw the whole figure)
+        """
+        if fast and filename.lower().endswith('.png') and ylim is not None \
+                and len(panels) == len(self.axes) \
+                and all(min(ylim) <= value <= max(ylim)
+                        for _, values in panels for value in values
+                        if math.isfinite(value)):
+            self.blit(filename, title, panels, tuple(ylim))
+            return
+        self.background = None
+        self.title.set_text(title)
+        for i, (ax, (line1, line2)) in enumerate(zip(self.axes, self.lines)):
+            ax.set_visible(i < len(panels))
+            if i >= len(panels):
+                continue
+            condition, values = panels[i]
+            ax.title.set_text(condition)
+            line1.set_ydata(values[:2])
+            line2.set_ydata(values[2:])
+            if ylim is not None:
+                ax.set_ylim(ylim)
+            else:
+                finite = [value for value in values if math.isfinite(value)]
+                low, high = (min(finite), max(finite)) if finite else (-1, 0)
+                margin = max(0.05 * (high - low), 0.5)
+                ax.set_ylim(low - margin, high + margin)
+        self.figure.savefig(filename)
+
+    def blit(self, filename, title, panels, ylim):
+        """
+        Draw a full png page with fixed y limits: restore the static part of
+        the figure and draw only the changing artists on top (see render).
+        Lines that leave the y limits would be drawn over the axes frame
+        here, so render only blits pages whose values are within them.
+        """
+        from matplotlib.image import imsave
+        canvas = self.figure.canvas
+        if self.background is None or self.background[0] != ylim:
+            for ax in self.axes:
+                ax.set_visible(True)
+                ax.set_ylim(ylim)
+            for artist in self.changing:  # left out of the full draw
+                artist.set_animated(True)
+            canvas.draw()
+            for artist in self.changing:
+                artist.set_animated(False)
+            self.background = ylim, canvas.copy_from_bbox(self.figure.bbox)
+        canvas.restore_region(self.background[1])
+        self.title.set_text(title)
+        for ax, (line1, line2), (condition, values) in zip(
+                self.axes, self.lines, panels):
+            ax.title.set_text(condition)
+            line1.set_ydata(values[:2])
+            line2.set_ydata(values[2:])
+        for artist in self.changing:
+            self.figure.draw_artist(artist)
+        imsave(filename, canvas.buffer_rgba(), format='png',
+               dpi=self.figure.dpi)
+
+
+def render_pages(pages, ncols=5, ylim=(-38, 0), dpi=100):
+    """
+    Render pages with one reused figure.
+    :param pages: list of (filename, title, panels)
+    :param ncols: number of panels per row
+    :param ylim: y axis limits (None: automatic)
+    :param dpi: resolution of raster output
+    :return: list of the files written
+    """
+    if not pages:
+        return []
+    renderer = PageRenderer(max(len(panels) for _, _, panels in pages), ncols,
+                            dpi=dpi)
+    for filename, title, panels in pages:
+        renderer.render(filename, title, panels, ylim)
+    return [filename for filename, _, _ in pages]
+
+
+def plot_conditions(table, output_dir, group_by=('dependency', 'n_gram'),
+                    ncols=5, ylim=(-38, 0), processes=1, file_format='png',
+                    dpi=100):
+    """
+    Plot all conditions of a results table as small multiples, one file per
+    group.
+    :param table: DataFrame with columns condition, distance, structure,
+                  log_probability and the group_by columns (e.g. the
+                  model_results or smoothing sweep tables)
+    :param output_dir: directory of the plots (created if missing)
+    :param group_by: columns that define the pages (in file name order)
+    :param ncols: number of panels per row
+    :param ylim: y axis limits (None: automatic)
+    :param processes: number of worker processes (experimental, see the
+                      module docstring; 1: render serially)
+    :param file_format: file extension, e.g. png, pdf or svg
+    :param dpi: resolution of raster output
+    :return: list of the files written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    group_by = [column for column in group_by if column in table.columns]
+    pages = []
+    groups = table.groupby(group_by, sort=False, dropna=False) if group_by \
+        else [((), table)]
+    for key, group in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        title = ', '.join(f'{value}' for value in key)
+        name = '_'.join(re.sub(r'[^\w.-]+', '-', f'{value}') for value in key)
+        filename = os.path.join(output_dir,
+                                f'{name or "conditions"}.{file_format}')
+        pages.append((filename, title, condition_panels(group)))
+    if processes <= 1 or len(pages) <= 1:
+        return render_pages(pages, ncols, ylim, dpi)
+    import multiprocessing
+    processes = min(processes, len(pages))
+    chunks = [pages[i::processes] for i in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        pool.starmap(render_pages, [(chunk, ncols, ylim, dpi)
+                                    for chunk in chunks])
+    return [filename for filename, _, _ in pages]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('results', nargs='+',
+                        help='results csv files or glob patterns')
+    parser.add_argument('-o', '--output-dir', default='plots')
+    parser.add_argument('--group-by', nargs='+',
+                        default=['dependency', 'n_gram', 'scheme', 'alpha'],
+                        help='columns that define the pages (those present '
+                             'in the table are used)')
+    parser.add_argument('--ncols', type=int, default=5)
+    parser.add_argument('--ylim', type=float, nargs=2, default=[-38, 0])
+    parser.add_argument('--auto-ylim', action='store_true',
+                        help='scale the y axis of every panel to its data')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='render the pages in a pool of processes '
+                             '(experimental, usually slower)')
+    parser.add_argument('--format', default='png')
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args()
+
+    import time
+    import pandas as pd
+    start = time.perf_counter()
+    filenames = [filename for pattern in args.results
+                 for filename in sorted(glob.glob(pattern)) or [pattern]]
+    table = pd.concat([pd.read_csv(filename) for filename in filenames],
+                      ignore_index=True)
+    written = plot_conditions(table, args.output_dir, args.group_by,
+                              args.ncols,
+                              None if args.auto_ylim else tuple(args.ylim),
+                              args.processes, args.format, args.dpi)
+    print(f'{len(written)} plots, {time.perf_counter() - start:.2f} s '
+          f'-> {args.output_dir}')
+
+
+if __name__ == "__main__":
+    main()
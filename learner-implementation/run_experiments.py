@@ -0,0 +1,291 @@
+"""
+Headless version of the RC/Wh x bigram/trigram notebooks.
+
+The island conditions, corpora, n-gram orders and output files are given in
+a condition spec (conditions.json by default). Each corpus is read once
+(through the load_paths cache), the n-grams of every order are counted from
+the same interned paths, and all condition paths are scored in one batch
+per order. The results are written as the model_results_*.csv files (and,
+with --bootstrap, the bootstrap_results_*.csv files) that the R analysis
+in results-visualization reads. With --bootstrap-summary, the bootstrap is
+summarized while it runs instead (see run_bootstrap): only the per-cell
+summary of the R analysis is written, optionally with all samples as a
+parquet file, and memory does not grow with the number of samples. With
+--sweep, the conditions are also scored over the smoothing grid of the spec
+(alphas x n-gram orders x schemes).
+With --plots, all results are also plotted per condition (see
+plot_conditions).
+
+Usage:
+    python run_experiments.py
+    python run_experiments.py --bootstrap 1000 --seed 1
+    python run_experiments.py --bootstrap 100000 --bootstrap-summary
+    python run_experiments.py --sweep --plots plots
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from learner_functions import BootstrapEngine, SmoothingSweep, load_paths, \
+    run_bootstrap
+
+
+def load_spec(filename):
+    """
+    Read a condition spec; file names in it are relative to the spec file.
+    :param filename: path of the json spec
+    :return: spec dict
+    """
+    with open(filename, encoding='utf-8') as f:
+        spec = json.load(f)
+    base = os.path.dirname(os.path.abspath(filename))
+    spec['corpora'] = {dependency: os.path.join(base, corpus)
+                       for dependency, corpus in spec['corpora'].items()}
+    for key in ('model_results', 'bootstrap_results', 'bootstrap_summary'):
+        if key in spec:
+            spec[key] = os.path.join(base, spec[key])
+    if 'sweep' in spec:
+        spec['sweep']['output'] = os.path.join(base, spec['sweep']['output'])
+    return spec
+
+
+def condition_table(spec):
+    """
+    List the cells of all conditions in the order of the spec.
+    :param spec: spec dict
+    :return: DataFrame with columns condition, distance, structure, path
+             (path without start and end nodes)
+    """
+    rows = []
+    for condition, cells in spec['conditions'].items():
+        for cell, path in cells.items():
+            distance, structure = cell.split()
+            rows.append((condition, distance, structure, path))
+    return pd.DataFrame(rows, columns=['condition', 'distance', 'structure',
+                                       'path'])
+
+
+def score_conditions(model, table, dependency, n_gram_name):
+    """
+    Score the condition paths, as the notebooks' model_results tables.
+    :param model: NgramModel
+    :param table: DataFrame as returned by condition_table
+    :param dependency: dependency name (e.g. RC)
+    :param n_gram_name: n-gram order name (e.g. Bigram)
+    :return: DataFrame with the model_results columns
+    """
+    log_probs, unattested = model.score(table['path'])
+    result = table[['condition', 'distance', 'structure']].copy()
+    result['path'] = ['start ' + path + ' end' for path in table['path']]
+    result['log_probability'] = log_probs
+    result['unattested_ngrams'] = [str(ngrams) for ngrams in unattested]
+    result['dependency'] = dependency
+    result['n_gram'] = n_gram_name
+    return result
+
+
+def bootstrap_conditions(corpus, table, n_gram, dependency, n_gram_name,
+                         num_samples, alpha=0.5, seed=None):
+    """
+    Bootstrap the condition paths, as the notebooks' bootstrap_results tables
+    (one row per sample and cell, with raw probabilities).
+    :param corpus: PathCorpus
+    :param table: DataFrame as returned by condition_table
+    :param n_gram: n-gram window size as int
+    :param dependency: dependency name (e.g. RC)
+    :param n_gram_name: n-gram order name (e.g. Bigram)
+    :param num_samples: number of bootstrap samples
+    :param alpha: additive smoothing parameter
+    :param seed: seed for reproducible samples
+    :return: DataFrame with the bootstrap_results columns
+    """
+    engine = BootstrapEngine(corpus.paths(), table['path'], n_gram, alpha)
+    log_probs, unattested = engine.sample(num_samples, seed)
+    padded = [str(['start'] + path.split() + ['end'])
+              for path in table['path']]
+    return pd.DataFrame({
+        'condition': np.tile(table['condition'], num_samples),
+        'distance': np.tile(table['distance'], num_samples),
+        'structure': np.tile(table['structure'], num_samples),
+        'path': padded * num_samples,
+        'raw_probability': np.exp(log_probs).ravel(),
+        'unattested_ngrams': [str(ngrams) for sample in unattested
+                              for ngrams in sample],
+        'dependency': dependency,
+        'n_gram': n_gram_name,
+        'bootstrap_sample': np.repeat(np.arange(1, num_samples + 1),
+                                      len(table))})
+
+
+def summarize_bootstrap(corpus, table, n_gram, dependency, n_gram_name,
+                        num_samples, alpha=0.5, seed=None, raw_file=None):
+    """
+    Bootstrap the condition paths with online summaries (see run_bootstrap),
+    as the R analysis' per-cell summary of the bootstrap_results tables.
+    :param corpus: PathCorpus
+    :param table: DataFrame as returned by condition_table
+    :param n_gram: n-gram window size as int
+    :param dependency: dependency name (e.g. RC)
+    :param n_gram_name: n-gram order name (e.g. Bigram)
+    :param num_samples: number of bootstrap samples
+    :param alpha: additive smoothing parameter
+    :param seed: seed for reproducible samples
+    :param raw_file: optional parquet file for all samples (written in
+                     chunks)
+    :return: DataFrame with one row per cell, as returned by run_bootstrap
+    """
+    engine = BootstrapEngine(corpus.paths(), table['path'], n_gram, alpha)
+    conditions = {'condition': table['condition'],
+                  'distance': table['distance'],
+                  'structure': table['structure'],
+                  'dependency': [dependency] * len(table),
+                  'n_gram': [n_gram_name] * len(table)}
+    result = run_bootstrap(engine, num_samples, conditions, seed,
+                           raw_file=raw_file)
+    result['path'] = 'start ' + result['path'] + ' end'
+    return result
+
+
+def bootstrap_summary_file(spec):
+    """
+    :param spec: spec dict as returned by load_spec
+    :return: file name pattern of the bootstrap summaries (bootstrap_summary
+             of the spec, or the bootstrap_results name with _summary)
+    """
+    if 'bootstrap_summary' in spec:
+        return spec['bootstrap_summary']
+    return os.path.splitext(spec['bootstrap_results'])[0] + '_summary.csv'
+
+
+def run(spec, bootstrap=0, seed=None, verbose=True, summary=False,
+        raw_samples=False):
+    """
+    Score all conditions for every dependency and n-gram order of the spec
+    and write the result files.
+    :param spec: spec dict as returned by load_spec
+    :param bootstrap: number of bootstrap samples (0: no bootstrap files)
+    :param seed: seed for reproducible bootstrap samples
+    :param verbose: print the files written
+    :param summary: write the bootstrap summaries (see summarize_bootstrap)
+                    instead of the bootstrap_results tables
+    :param raw_samples: with summary, also write all samples as parquet
+                        files (named as the bootstrap_results tables)
+    :return: dict (dependency, n-gram order name) -> model_results DataFrame
+    """
+    table = condition_table(spec)
+    alpha = spec.get('alpha', 0.5)
+    results = {}
+    for dependency, filename in spec['corpora'].items():
+        corpus = load_paths(filename)
+        for n_gram_name, n_gram in spec['n_grams'].items():
+            start = time.perf_counter()
+            names = {'dependency': dependency.lower(),
+                     'n_gram': n_gram_name.lower()}
+            model = corpus.ngram_model(n_gram, alpha)
+            result = score_conditions(model, table, dependency, n_gram_name)
+            outfile = spec['model_results'].format(**names)
+            result.to_csv(outfile, index=False)
+            results[dependency, n_gram_name] = result
+            written = [outfile]
+            if bootstrap and summary:
+                outfile = bootstrap_summary_file(spec).format(**names)
+                raw_file = os.path.splitext(spec['bootstrap_results'].format(
+                    **names))[0] + '.parquet' if raw_samples else None
+                boot = summarize_bootstrap(corpus, table, n_gram, dependency,
+                                           n_gram_name, bootstrap, alpha,
+                                           seed, raw_file)
+                boot.to_csv(outfile, index=False)
+                written.extend([outfile] + ([raw_file] if raw_file else []))
+            elif bootstrap:
+                boot = bootstrap_conditions(corpus, table, n_gram, dependency,
+                                            n_gram_name, bootstrap, alpha,
+                                            seed)
+                outfile = spec['bootstrap_results'].format(**names)
+                boot.to_csv(outfile, index=False)
+                written.append(outfile)
+            if verbose:
+                print(f'{dependency} {n_gram_name}: {len(corpus)} paths, '
+                      f'{model.types} n-grams, '
+                      f'{time.perf_counter() - start:.2f} s -> '
+                      + ', '.join(written))
+    return results
+
+
+def run_sweep(spec, verbose=True):
+    """
+    Score all conditions over the smoothing grid of the spec, per dependency,
+    and write one tidy table per dependency.
+    :param spec: spec dict as returned by load_spec
+    :param verbose: print the files written
+    :return: dict dependency -> sweep DataFrame
+    """
+    grid = spec['sweep']
+    table = condition_table(spec)
+    results = {}
+    for dependency, filename in spec['corpora'].items():
+        start = time.perf_counter()
+        corpus = load_paths(filename)
+        sweep = SmoothingSweep(corpus.paths(), max(grid['n_grams']))
+        result = sweep.sweep(table, grid['alphas'], grid['n_grams'],
+                             grid.get('schemes'))
+        result.insert(len(table.columns), 'dependency', dependency)
+        result['path'] = 'start ' + result['path'] + ' end'
+        outfile = grid['output'].format(dependency=dependency.lower())
+        result.to_csv(outfile, index=False)
+        results[dependency] = result
+        if verbose:
+            print(f'{dependency} sweep: {len(result)} rows, '
+                  f'{time.perf_counter() - start:.2f} s -> {outfile}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--spec', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'conditions.json'),
+        help='condition spec (default: conditions.json)')
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='also write bootstrap results with N samples')
+    parser.add_argument('--bootstrap-summary', action='store_true',
+                        help='write the per-cell bootstrap summary instead '
+                             'of every sample (constant memory)')
+    parser.add_argument('--raw-samples', action='store_true',
+                        help='with --bootstrap-summary, also write all '
+                             'samples as parquet')
+    parser.add_argument('--seed', type=int, help='bootstrap seed')
+    parser.add_argument('--sweep', action='store_true',
+                        help='also write the smoothing sweep tables')
+    parser.add_argument('--plots', metavar='DIR',
+                        help='also plot the results into DIR')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of processes for the plots '
+                             '(experimental, usually slower)')
+    args = parser.parse_args()
+    spec = load_spec(args.spec)
+    results = run(spec, args.bootstrap, args.seed,
+                  summary=args.bootstrap_summary,
+                  raw_samples=args.raw_samples)
+    sweeps = run_sweep(spec) if args.sweep else {}
+    if args.plots:
+        from plot_conditions import plot_conditions
+        start = time.perf_counter()
+        written = plot_conditions(pd.concat(results.values()), args.plots,
+                                  processes=args.processes)
+        if sweeps:
+            sweep = pd.concat(sweeps.values())
+            # one y range for all settings, so that the pages are comparable
+            low = np.floor(sweep['log_probability'].min()) - 1
+            written += plot_conditions(
+                sweep, args.plots,
+                group_by=('dependency', 'scheme', 'n_gram', 'alpha'),
+                ylim=(low, 0), processes=args.processes)
+        print(f'{len(written)} plots, {time.perf_counter() - start:.2f} s '
+              f'-> {args.plots}')
+
+
+if __name__ == "__main__":
+    main()
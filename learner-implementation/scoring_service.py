@@ -0,0 +1,220 @@
+"""
+Long-running scoring process for container node paths.
+
+The learner is loaded once (from a model file written by save_models, or
+trained from a path table with load_paths) and then answers batched
+requests, either as JSON lines on stdin/stdout or over HTTP on localhost.
+
+A request is a JSON object
+    {"id": 1, "paths": ["COMP_nominal OBJ", ["ADJUNCT", "OBJ"]]}
+and is answered with
+    {"id": 1, "results": [{"path": [...], "log_prob": -7.1,
+                           "ngrams": [[["start", "COMP_nominal"], -2.3, 41],
+                                      ...],
+                           "unattested": [["OBJ", "end"]]}, ...]}
+where every n-gram comes with its log probability contribution and count.
+Set "ngrams": false in the request to get only log_prob and unattested.
+{"stats": true} (or GET /stats over HTTP) returns the counters.
+
+Usage:
+    python scoring_service.py --model rc.ngm --n-gram 2
+    python scoring_service.py --paths output_rc_corrected_oct23.xlsx \\
+        --n-gram 3 --http 8765
+"""
+import argparse
+import collections
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from learner_functions import NgramModel, load_paths
+
+
+class ScoringService:
+    """
+    Answer scoring requests against one model and keep latency counters.
+    """
+
+    def __init__(self, model, window=10000):
+        """
+        :param model: NgramModel
+        :param window: number of recent requests kept for latency percentiles
+        """
+        self.model = model
+        self.started = time.time()
+        self.requests = 0
+        self.paths = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.latencies = collections.deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def handle(self, request):
+        """
+        Answer one request.
+        :param request: decoded JSON request (dict)
+        :return: response dict
+        """
+        if request.get('stats'):
+            return {'id': request.get('id'), 'stats': self.stats()}
+        start = time.perf_counter()
+        try:
+            paths = request['paths']
+            if not isinstance(paths, list):
+                raise ValueError('paths must be a list')
+            if request.get('ngrams', True):
+                log_probs, ngrams = self.model.score_ngrams(paths)
+                results = [{'path': path, 'log_prob': log_prob,
+                            'ngrams': [[list(ngr), contribution, count]
+                                       for ngr, contribution, count
+                                       in ngr_path],
+                            'unattested': [list(ngr)
+                                           for ngr, _, count in ngr_path
+                                           if count == 0]}
+                           for path, log_prob, ngr_path
+                           in zip(paths, log_probs.tolist(), ngrams)]
+            else:
+                log_probs, unattested = self.model.score(paths)
+                results = [{'path': path, 'log_prob': log_prob,
+                            'unattested': [list(ngr) for ngr in path_unatt]}
+                           for path, log_prob, path_unatt
+                           in zip(paths, log_probs.tolist(), unattested)]
+            response = {'id': request.get('id'), 'results': results}
+        except (KeyError, TypeError, ValueError) as error:
+            paths = []
+            response = {'id': request.get('id'),
+                        'error': f'{type(error).__name__}: {error}'}
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.requests += 1
+            self.paths += len(paths)
+            self.errors += 'error' in response
+            self.busy_seconds += latency
+            self.latencies.append(latency)
+        return response
+
+    def stats(self):
+        """
+        :return: dict of counters: requests, paths and errors so far, paths
+                 per busy second, latency percentiles (ms) of recent requests
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            stats = {'uptime_s': time.time() - self.started,
+                     'requests': self.requests,
+                     'paths': self.paths,
+                     'errors': self.errors,
+                     'paths_per_s': self.paths / self.busy_seconds
+                     if self.busy_seconds else 0.0}
+        if len(latencies):
+            for q in (50, 90, 99):
+                stats[f'latency_p{q}_ms'] = float(np.percentile(latencies, q))
+            stats['latency_max_ms'] = float(latencies.max())
+        return stats
+
+
+def serve_jsonl(service, infile=sys.stdin, outfile=sys.stdout):
+    """
+    Answer JSON-lines requests until the input ends.
+    :param service: ScoringService
+    :param infile: input stream with one request per line
+    :param outfile: output stream, one response per line
+    """
+    for line in infile:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+        except ValueError as error:
+            response = {'id': None, 'error': f'bad request: {error}'}
+        else:
+            response = service.handle(request)
+        outfile.write(json.dumps(response) + '\n')
+        outfile.flush()
+
+
+def serve_http(service, port, host='127.0.0.1'):
+    """
+    Answer requests POSTed as JSON, and GET /stats, until interrupted.
+    :param service: ScoringService
+    :param port: port to listen on
+    :param host: interface to bind, localhost by default
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, response):
+            body = json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                self.send_json(200, service.stats())
+            else:
+                self.send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                request = json.loads(self.rfile.read(length))
+                if not isinstance(request, dict):
+                    raise ValueError('request must be a JSON object')
+            except ValueError as error:
+                self.send_json(400, {'error': f'bad request: {error}'})
+                return
+            response = service.handle(request)
+            self.send_json(400 if 'error' in response else 200, response)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f'Scoring on http://{host}:{server.server_port}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--model', help='model file written by save_models')
+    source.add_argument('--paths', help='path table (xlsx or csv) to train on')
+    parser.add_argument('--n-gram', type=int,
+                        help='n-gram order (optional for single-order model '
+                             'files)')
+    parser.add_argument('--alpha', type=float, default=0.5,
+                        help='smoothing parameter when training from --paths')
+    parser.add_argument('--http', type=int, metavar='PORT',
+                        help='serve HTTP on localhost instead of stdin/stdout')
+    args = parser.parse_args()
+
+    if args.model:
+        model = NgramModel.load(args.model, args.n_gram)
+    else:
+        if args.n_gram is None:
+            parser.error('--n-gram is required with --paths')
+        model = load_paths(args.paths).ngram_model(args.n_gram, args.alpha)
+    service = ScoringService(model)
+    if args.http is not None:
+        serve_http(service, args.http)
+    else:
+        serve_jsonl(service)
+    print(json.dumps(service.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+The bootstrap engine against get_prob on the resampled corpora, and the
+online summary against the R analysis on all samples (sort each test path's
+log probabilities and keep slice(26:975) of 1000).
+"""
+import numpy as np
+import pytest
+from scipy.special import logsumexp
+
+from learner_functions import BootstrapEngine, BootstrapSummary
+from test_scoring import CORPUS, TEST_PATHS, reference
+
+
+@pytest.mark.parametrize('n_gram', [1, 2, 3])
+def test_resample_matches_get_prob(n_gram):
+    engine = BootstrapEngine(CORPUS, TEST_PATHS, n_gram)
+    log_probs, unattested = engine.sample(3, seed=7)
+    # the same draws as iter_samples
+    weights = np.random.default_rng(7).multinomial(
+        engine.num_paths, engine.multiplicity / engine.num_paths, size=3)
+    for sample in range(3):
+        resample = [path.split() for path, weight in zip(
+                        engine.unique_paths, weights[sample])
+                    for _ in range(weight)]
+        expected, expected_unattested = reference(TEST_PATHS, n_gram,
+                                                  corpus=resample)
+        np.testing.assert_allclose(log_probs[sample], expected)
+        assert unattested[sample] == expected_unattested
+
+
+def test_summary_matches_sorted_samples():
+    engine = BootstrapEngine(CORPUS, TEST_PATHS, 2)
+    log_probs, _ = engine.sample(1000, seed=3)
+    summary = BootstrapSummary(len(TEST_PATHS))
+    for start in range(0, 1000, 300):  # in batches, as run_bootstrap
+        summary.update(log_probs[start:start + 300])
+    inside = np.sort(log_probs, axis=0)[25:975]  # R: slice(26:975)
+    lower, upper = summary.interval()
+    assert np.all(np.abs(lower - inside[0]) <= summary.bin_width)
+    assert np.all(np.abs(upper - inside[-1]) <= summary.bin_width)
+    expected = logsumexp(inside, axis=0) - np.log(len(inside))
+    assert np.all(np.abs(summary.trimmed_avg_log_prob() - expected)
+                  <= summary.bin_width)
+    np.testing.assert_allclose(summary.mean, log_probs.mean(axis=0))
+    np.testing.assert_allclose(summary.variance(),
+                               log_probs.var(axis=0, ddof=1))
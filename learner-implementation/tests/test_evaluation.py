@@ -0,0 +1,41 @@
+"""
+Held-out evaluation by count subtraction against retraining without the
+held-out paths.
+"""
+import numpy as np
+import pytest
+
+from learner_functions import HeldOutEvaluator, NgramModel
+from test_scoring import CORPUS
+
+
+@pytest.mark.parametrize('n_gram', [1, 2, 3])
+def test_leave_one_out_matches_retraining(n_gram):
+    evaluator = HeldOutEvaluator(CORPUS, n_gram)
+    log_probs, unattested = evaluator.leave_one_out()
+    paths = [' '.join(path) for path in CORPUS]
+    for i, path in enumerate(evaluator.unique_paths):
+        rest = list(paths)
+        rest.remove(path)
+        model = NgramModel.from_paths(rest, n_gram)
+        expected, expected_unattested = model.score([path])
+        assert log_probs[i] == pytest.approx(expected[0])
+        assert unattested[i] == len(expected_unattested[0])
+
+
+def test_k_fold_matches_retraining():
+    evaluator = HeldOutEvaluator(CORPUS, 2)
+    folds = evaluator.k_fold(k=3, seed=1)
+    # the split of k_fold, as a fold number per corpus path
+    rng = np.random.default_rng(1)
+    path_idx = np.repeat(np.arange(len(evaluator.unique_paths)),
+                         evaluator.multiplicity)
+    fold_of = rng.permutation(evaluator.num_paths) % 3
+    for fold in range(3):
+        held = [evaluator.unique_paths[i]
+                for i in path_idx[fold_of == fold]]
+        rest = [evaluator.unique_paths[i]
+                for i in path_idx[fold_of != fold]]
+        log_probs, _ = NgramModel.from_paths(rest, 2).score(held)
+        assert folds['log_likelihood'][fold] == \
+            pytest.approx(log_probs.sum())
@@ -0,0 +1,43 @@
+"""
+The incremental model against get_prob on a FreqDist of the paths it
+currently holds, after interleaved additions and removals.
+"""
+import numpy as np
+import pytest
+
+from learner_functions import IncrementalNgramModel
+from test_scoring import CORPUS, TEST_PATHS, reference
+
+
+@pytest.mark.parametrize('n_gram', [1, 2, 3])
+def test_incremental_model_matches_get_prob(n_gram):
+    model = IncrementalNgramModel(n_gram)
+    current = list()
+    # add three batches, removing part of the previous one after each
+    for start in range(0, len(CORPUS), 100):
+        batch = CORPUS[start:start + 100]
+        model.add_paths(batch)
+        current.extend(batch)
+        removed = current[-150:-120]
+        model.remove_paths(removed)
+        del current[-150:-120]
+        expected, expected_unattested = reference(TEST_PATHS, n_gram,
+                                                  corpus=current)
+        log_probs, unattested = model.score(TEST_PATHS)
+        np.testing.assert_allclose(log_probs, expected)
+        assert unattested == expected_unattested
+        log_probs, _ = model.compile().score(TEST_PATHS)
+        np.testing.assert_allclose(log_probs, expected)
+    assert model.num_paths == len(current)
+
+
+def test_failed_removal_leaves_the_model_unchanged():
+    model = IncrementalNgramModel(2)
+    model.add_paths(CORPUS[:50])
+    counts, total, num_paths = dict(model.counts), model.total, \
+        model.num_paths
+    # the first path can be removed, the second one was never added
+    with pytest.raises(ValueError):
+        model.remove_paths([CORPUS[0], ['SUBJ', 'PREDLINK']])
+    assert (model.counts, model.total, model.num_paths) == \
+        (counts, total, num_paths)
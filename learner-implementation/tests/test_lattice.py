@@ -0,0 +1,44 @@
+"""
+Lattice queries against scoring every path up to a length.
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from learner_functions import NgramModel, PathLattice
+from test_scoring import CORPUS
+
+MAX_LENGTH = 3
+
+
+def all_paths(model, max_length):
+    labels = [label for label in model.labels
+              if label not in ('start', 'end')]
+    return [list(path) for length in range(1, max_length + 1)
+            for path in itertools.product(labels, repeat=length)]
+
+
+@pytest.mark.parametrize('n_gram', [1, 2, 3])
+def test_k_best_matches_enumeration(n_gram):
+    model = NgramModel.from_paths(CORPUS, n_gram)
+    paths = all_paths(model, MAX_LENGTH)
+    log_probs, _ = model.score(paths)
+    k_best = PathLattice(model).k_best(k=20, max_length=MAX_LENGTH)
+    np.testing.assert_allclose([log_prob for log_prob, _ in k_best],
+                               np.sort(log_probs)[::-1][:20])
+    # each path is scored as the model scores it
+    found, _ = model.score([path for _, path in k_best])
+    np.testing.assert_allclose(found, [log_prob for log_prob, _ in k_best])
+
+
+@pytest.mark.parametrize('n_gram', [1, 2, 3])
+def test_log_mass_by_length_matches_enumeration(n_gram):
+    model = NgramModel.from_paths(CORPUS, n_gram)
+    paths = all_paths(model, MAX_LENGTH)
+    log_probs, _ = model.score(paths)
+    lengths = np.array([len(path) for path in paths])
+    mass = PathLattice(model).log_mass_by_length(MAX_LENGTH)
+    for length in range(max(1, n_gram - 2), MAX_LENGTH + 1):
+        assert mass[length - 1] == pytest.approx(
+            np.log(np.exp(log_probs[lengths == length]).sum()))
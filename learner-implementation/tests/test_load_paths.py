@@ -0,0 +1,68 @@
+"""
+The path table cache of load_paths: reused while the source is unchanged,
+rebuilt when it changes.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from learner_functions import load_paths
+
+PATHS = ['SUBJ', 'OBJ COMP_nominal', 'XCOMP XCOMP OBJ', 'ADJUNCT SUBJ']
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """
+    :return: list of the files read from the source format
+    """
+    files = list()
+    read_csv = pd.read_csv
+
+    def counting_read_csv(filename, *args, **kwargs):
+        files.append(filename)
+        return read_csv(filename, *args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', counting_read_csv)
+    return files
+
+
+def write_table(filename, paths):
+    pd.DataFrame({'sentence_id': range(len(paths)),
+                  'cleaned_path': paths}).to_csv(filename, index=False)
+
+
+def test_cache_is_reused_while_unchanged(tmp_path, reads):
+    filename = str(tmp_path / 'paths.csv')
+    write_table(filename, PATHS)
+    expected = [path.split() for path in PATHS]
+    assert load_paths(filename).paths() == expected
+    assert load_paths(filename).paths() == expected
+    assert len(reads) == 1
+    # touched but unchanged: the signature of the cache is updated
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_paths(filename).paths() == expected
+    assert load_paths(filename).paths() == expected
+    assert len(reads) == 1
+    corpus = load_paths(filename)
+    assert corpus.data['sentence_id'].tolist() == list(range(len(PATHS)))
+
+
+def test_cache_is_rebuilt_when_changed(tmp_path, reads):
+    filename = str(tmp_path / 'paths.csv')
+    write_table(filename, PATHS)
+    load_paths(filename)
+    write_table(filename, PATHS[::-1])
+    assert load_paths(filename).paths() == [path.split()
+                                            for path in PATHS[::-1]]
+    assert load_paths(filename).paths() == [path.split()
+                                            for path in PATHS[::-1]]
+    assert len(reads) == 2
+
+
+def test_blank_path_is_read_as_in_the_notebooks(tmp_path):
+    filename = str(tmp_path / 'paths.csv')
+    write_table(filename, ['SUBJ', None])
+    assert load_paths(filename).paths() == [['SUBJ'], ['nan']]
@@ -0,0 +1,41 @@
+"""
+Models written with save_models score the same after load_models.
+"""
+import numpy as np
+import pytest
+
+from learner_functions import NgramModel, load_models, save_models
+from test_scoring import CORPUS, TEST_PATHS
+
+
+def test_saved_models_score_identically(tmp_path):
+    filename = str(tmp_path / 'models.bin')
+    models = [NgramModel.from_paths(CORPUS, n_gram, alpha=0.25)
+              for n_gram in [1, 2, 3]]
+    save_models(filename, models)
+    loaded = load_models(filename)
+    assert sorted(loaded) == [1, 2, 3]
+    for model in models:
+        log_probs, unattested = model.score(TEST_PATHS)
+        loaded_log_probs, loaded_unattested = \
+            loaded[model.n_gram].score(TEST_PATHS)
+        np.testing.assert_array_equal(loaded_log_probs, log_probs)
+        assert loaded_unattested == unattested
+        assert loaded[model.n_gram].alpha == 0.25
+
+
+def test_single_model_round_trip(tmp_path):
+    filename = str(tmp_path / 'bigram.bin')
+    model = NgramModel.from_paths(CORPUS, 2)
+    model.save(filename)
+    np.testing.assert_array_equal(NgramModel.load(filename).score(
+        TEST_PATHS)[0], model.score(TEST_PATHS)[0])
+    with pytest.raises(KeyError):
+        NgramModel.load(filename, 3)
+
+
+def test_load_rejects_other_files(tmp_path):
+    filename = tmp_path / 'paths.csv'
+    filename.write_text('cleaned_path\nSUBJ\n')
+    with pytest.raises(ValueError):
+        load_models(str(filename))
@@ -0,0 +1,30 @@
+"""
+Blitted png pages against pages drawn in full with savefig.
+"""
+import numpy as np
+import pytest
+
+from plot_conditions import PageRenderer
+
+PANELS = [(f'condition {i}', [-5.0 - i, -12.0 - i, -7.5, -20.0 - 2 * i])
+          for i in range(6)]
+
+
+def read_png(filename):
+    from matplotlib.image import imread
+    return imread(filename)
+
+
+@pytest.mark.parametrize('ylim', [(-38, 0), (-25, 0)])
+def test_blitted_page_matches_savefig(tmp_path, ylim):
+    blitter = PageRenderer(len(PANELS), ncols=3)
+    drawer = PageRenderer(len(PANELS), ncols=3)
+    # the second page reuses the background saved for the first one
+    for page, panels in enumerate([PANELS[::-1], PANELS]):
+        blitted = str(tmp_path / f'blitted_{page}.png')
+        drawn = str(tmp_path / f'drawn_{page}.png')
+        blitter.render(blitted, f'page {page}', panels, ylim)
+        drawer.render(drawn, f'page {page}', panels, ylim, fast=False)
+        # (values below the y limits: drawn in full by both)
+        assert (blitter.background is not None) == (min(ylim) <= -30)
+        np.testing.assert_array_equal(read_png(blitted), read_png(drawn))
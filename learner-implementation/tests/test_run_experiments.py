@@ -0,0 +1,33 @@
+"""
+The experiment runner reproduces the committed model_results tables of the
+notebooks.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from run_experiments import load_spec, run
+
+SPEC = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'conditions.json')
+
+
+def test_run_reproduces_model_results(tmp_path):
+    spec = load_spec(SPEC)
+    committed = spec['model_results']
+    spec['model_results'] = str(tmp_path / os.path.basename(committed))
+    results = run(spec, verbose=False)
+    assert len(results) == 4
+    for dependency in spec['corpora']:
+        for n_gram_name in spec['n_grams']:
+            names = {'dependency': dependency.lower(),
+                     'n_gram': n_gram_name.lower()}
+            expected = pd.read_csv(committed.format(**names))
+            written = pd.read_csv(spec['model_results'].format(**names))
+            pd.testing.assert_frame_equal(
+                written.drop(columns='log_probability'),
+                expected.drop(columns='log_probability'))
+            np.testing.assert_allclose(written['log_probability'],
+                                       expected['log_probability'],
+                                       rtol=0, atol=1e-12)
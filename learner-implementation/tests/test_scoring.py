@@ -0,0 +1,58 @@
+"""
+The compiled scorers against the reference implementation (get_prob on an
+nltk FreqDist), on a small random path corpus.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from learner_functions import get_freq_dist, get_ngrams, get_prob, \
+    NgramModel, TrieScorer
+
+LABELS = ['SUBJ', 'OBJ', 'COMP_nominal', 'XCOMP', 'ADJUNCT', 'ADJUNCT_adv']
+
+
+def random_paths(num_paths, seed, max_length=4):
+    rng = random.Random(seed)
+    return [[rng.choice(LABELS) for _ in range(rng.randint(1, max_length))]
+            for _ in range(num_paths)]
+
+
+CORPUS = random_paths(300, seed=1)
+# test paths with labels and n-grams the corpus does not have
+TEST_PATHS = random_paths(50, seed=2) + [['SUBJ', 'PREDLINK'], ['OBL-TH']]
+
+
+def reference(paths, n_gram, corpus=CORPUS):
+    """
+    :return: log probs and unattested n-grams of get_prob
+    """
+    freq_dist = get_freq_dist([ngram for path in corpus
+                               for ngram in get_ngrams(path, n_gram)])
+    results = [get_prob(path, freq_dist, n_gram) for path in paths]
+    return np.array([r[0] for r in results]), [r[2] for r in results]
+
+
+@pytest.mark.parametrize('n_gram', [1, 2, 3])
+def test_ngram_model_matches_get_prob(n_gram):
+    expected, expected_unattested = reference(TEST_PATHS, n_gram)
+    log_probs, unattested = NgramModel.from_paths(CORPUS, n_gram).score(
+        TEST_PATHS)
+    np.testing.assert_allclose(log_probs, expected)
+    assert [list(map(tuple, ngrams)) for ngrams in unattested] == \
+        expected_unattested
+
+
+@pytest.mark.parametrize('n_gram', [1, 2, 3])
+def test_trie_scorer_matches_get_prob(n_gram):
+    expected, expected_unattested = reference(TEST_PATHS, n_gram)
+    scorer = TrieScorer(NgramModel.from_paths(CORPUS, n_gram))
+    # two batches: the second one reuses the prefixes of the first
+    half = len(TEST_PATHS) // 2
+    first, first_unattested = scorer.score(TEST_PATHS[:half])
+    second, second_unattested = scorer.score(TEST_PATHS[half:])
+    np.testing.assert_allclose(np.concatenate([first, second]), expected)
+    assert [list(map(tuple, ngrams))
+            for ngrams in first_unattested + second_unattested] == \
+        expected_unattested
@@ -0,0 +1,70 @@
+"""
+JSON-lines requests to the scoring service, answered as get_prob would.
+"""
+import io
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from learner_functions import NgramModel, split_path
+from scoring_service import ScoringService, serve_jsonl
+from test_scoring import CORPUS, TEST_PATHS, reference
+
+SERVICE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'scoring_service.py')
+PATHS = [' '.join(TEST_PATHS[0]), TEST_PATHS[1], ['SUBJ', 'PREDLINK']]
+
+
+def requests():
+    return [{'id': 1, 'paths': PATHS},
+            {'id': 2, 'paths': PATHS, 'ngrams': False},
+            {'id': 3},
+            {'stats': True, 'id': 4}]
+
+
+def check_responses(responses):
+    expected, expected_unattested = reference(
+        [split_path(path) for path in PATHS], 2)
+    assert [response['id'] for response in responses] == [1, 2, 3, None, 4]
+    for response in responses[:2]:
+        results = response['results']
+        assert [result['path'] for result in results] == PATHS
+        np.testing.assert_allclose([result['log_prob'] for result in results],
+                                   expected)
+        assert [[tuple(ngr) for ngr in result['unattested']]
+                for result in results] == expected_unattested
+    for result in responses[0]['results']:
+        assert np.isclose(sum(contribution for _, contribution, _
+                              in result['ngrams']), result['log_prob'])
+    assert 'ngrams' not in responses[1]['results'][0]
+    assert responses[2]['error'].startswith('KeyError')
+    assert responses[3]['error'].startswith('bad request')
+    stats = responses[4]['stats']
+    assert (stats['requests'], stats['paths'], stats['errors']) == (3, 6, 1)
+
+
+def test_jsonl_requests():
+    lines = [json.dumps(request) for request in requests()]
+    lines.insert(3, '[1, 2]')  # not an object
+    lines.insert(1, '')  # blank lines are skipped
+    outfile = io.StringIO()
+    serve_jsonl(ScoringService(NgramModel.from_paths(CORPUS, 2)),
+                io.StringIO('\n'.join(lines) + '\n'), outfile)
+    check_responses([json.loads(line)
+                     for line in outfile.getvalue().splitlines()])
+
+
+def test_service_process(tmp_path):
+    filename = str(tmp_path / 'bigram.bin')
+    NgramModel.from_paths(CORPUS, 2).save(filename)
+    lines = [json.dumps(request) for request in requests()]
+    lines.insert(3, '{"id": ')  # malformed
+    process = subprocess.run([sys.executable, SERVICE, '--model', filename],
+                             input='\n'.join(lines) + '\n', text=True,
+                             capture_output=True, timeout=60, check=True)
+    check_responses([json.loads(line)
+                     for line in process.stdout.splitlines()])
+    assert json.loads(process.stderr)['requests'] == 3
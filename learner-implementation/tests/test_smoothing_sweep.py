@@ -0,0 +1,48 @@
+"""
+The smoothing sweep: the additive scheme against NgramModel (and get_prob),
+and the conditional schemes as proper distributions over the next label.
+"""
+import numpy as np
+import pytest
+
+from learner_functions import NgramModel, SmoothingSweep
+from test_scoring import CORPUS, TEST_PATHS, reference
+
+ALPHAS = [0.05, 0.5, 2]
+
+
+@pytest.fixture(scope='module')
+def sweep():
+    return SmoothingSweep(CORPUS, max_order=3)
+
+
+def test_additive_matches_ngram_model(sweep):
+    table = sweep.sweep(TEST_PATHS, ALPHAS, n_grams=[1, 2, 3],
+                        schemes=['additive'])
+    assert len(table) == 3 * len(ALPHAS) * len(TEST_PATHS)
+    for (n_gram, alpha), group in table.groupby(['n_gram', 'alpha']):
+        log_probs, _ = NgramModel.from_paths(CORPUS, n_gram, alpha).score(
+            TEST_PATHS)
+        np.testing.assert_allclose(group['log_probability'], log_probs)
+        if alpha == 0.5:
+            np.testing.assert_allclose(group['log_probability'],
+                                       reference(TEST_PATHS, n_gram)[0])
+
+
+@pytest.mark.parametrize('scheme', ['interpolated', 'backoff'])
+@pytest.mark.parametrize('n_gram', [2, 3])
+def test_conditional_sums_to_one(sweep, scheme, n_gram):
+    ids = sweep.label_ids
+    # every label but start can follow, and one slot for unknown labels
+    following = [label_id for label, label_id in ids.items()
+                 if label != 'start'] + [-1]
+    histories = [[ids['start']], [ids['SUBJ']], [ids['end']], [-1]]
+    if n_gram == 3:
+        histories = [[-1, ids['start']], [ids['start'], ids['OBJ']],
+                     [ids['XCOMP'], ids['XCOMP']], [ids['end'], ids['SUBJ']],
+                     [-1, -1]]
+    for history in histories:
+        grams = np.array([history + [label_id] for label_id in following])
+        probs = sweep.conditional(n_gram, grams, ALPHAS, scheme)
+        assert np.all(probs > 0)
+        np.testing.assert_allclose(probs.sum(axis=1), 1)